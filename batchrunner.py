@@ -0,0 +1,212 @@
+import os
+import sqlite3
+import typing
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+
+import exporter
+from climbersreporter import Reporter
+from memorybudget import SpilledResult
+from mountain import Mountain
+
+# Reporter methods that change or re-point the Reporter; never run as jobs
+NOT_REPORTS = {
+    "initialize_database",
+    "refresh_replica",
+    "set_memory_budget",
+    "enable_result_cache",
+    "cached",
+    "dataset_version",
+    "snapshot",
+}
+
+# Reporter of the current worker process, opened once by _init_worker
+_worker_reporter = None
+
+
+class ReportJob:
+    """
+    One report to generate: a Reporter method, its arguments and where to
+    write the result.
+
+    Attributes:
+        report (str): Name of the Reporter method, e.g. "get_climbers_from_country".
+        args (tuple): Positional arguments for the method.
+        output (str): File to write the result to, or None to only count it.
+        fmt (str): Export format, see exporter.FORMATS.
+        compress (bool): Gzip the output.
+    """
+
+    def __init__(
+        self,
+        report: str,
+        args: tuple = (),
+        output: str = None,
+        fmt: str = "csv",
+        compress: bool = False,
+    ) -> None:
+        """
+        Initializes a ReportJob.
+
+        Args:
+            report (str): Name of the Reporter method to call.
+            args (tuple): Positional arguments for the method.
+            output (str, optional): File to write the result to.
+            fmt (str): Export format, see exporter.FORMATS.
+            compress (bool): Gzip the output.
+        """
+        if (
+            report.startswith("_")
+            or report in NOT_REPORTS
+            or not callable(getattr(Reporter, report, None))
+        ):
+            raise ValueError(f"Unknown report: {report}")
+        self.report = report
+        self.args = tuple(args)
+        self.output = output
+        self.fmt = fmt
+        self.compress = compress
+
+    def __repr__(self) -> str:
+        """Returns a readable string representation of the job."""
+        return f"ReportJob(report={self.report}, args={self.args}, output={self.output})"
+
+    def query_key(self) -> str:
+        """Returns a key that is equal for jobs running the same query."""
+        # Model objects have no __eq__, but their repr lists every field
+        return f"{self.report}{self.args!r}"
+
+
+def _result_model(report: str) -> type:
+    """Returns the model class a Reporter method returns a tuple of."""
+    annotation = typing.get_type_hints(getattr(Reporter, report)).get("return")
+    args = typing.get_args(annotation)
+    if args and args[0] in exporter.COLUMNS:
+        return args[0]
+    return None
+
+
+def _init_worker(db_path: str, replica: str) -> None:
+    """Opens the read-only Reporter of a worker process."""
+    global _worker_reporter
+    _worker_reporter = Reporter()
+    _worker_reporter.initialize_database(db_path, replica=replica)
+
+
+def _run_query(report: str, args: tuple, outputs: list) -> tuple[int, list]:
+    """Runs one unique query in a worker and writes all of its outputs."""
+    result = getattr(_worker_reporter, report)(*args)
+    model = _result_model(report)
+    paths = [
+        exporter.export_report(result, path, fmt, compress, model)
+        for path, fmt, compress in outputs
+    ]
+    size = len(result) if isinstance(result, (tuple, SpilledResult)) else 1
+    return size, paths
+
+
+def run_batch(
+    db_path: str,
+    jobs,
+    max_workers: int = None,
+    replica: str = "mmap",
+) -> list[tuple[ReportJob, int, str]]:
+    """
+    Runs report jobs on a pool of processes. Every worker opens its own
+    read-only replica of the database, jobs with the same query run only
+    once, and workers write their outputs themselves.
+
+    Args:
+        db_path (str): Path to the SQLite database.
+        jobs (Iterable[ReportJob]): The reports to generate.
+        max_workers (int, optional): Number of processes, default one per core.
+        replica (str): Replica mode for the workers, "mmap" or "memory".
+
+    Returns:
+        list[tuple[ReportJob, int, str]]: Per job, in order: the job, the
+        number of results and the written path (None without output).
+    """
+    jobs = list(jobs)
+    queries = {}
+    for job in jobs:
+        query = queries.setdefault(job.query_key(), (job, []))
+        if job.output is not None:
+            output = (job.output, job.fmt, job.compress)
+            if output not in query[1]:
+                query[1].append(output)
+
+    with ProcessPoolExecutor(
+        max_workers=max_workers,
+        initializer=_init_worker,
+        initargs=(db_path, replica),
+    ) as pool:
+        futures = {
+            key: pool.submit(_run_query, job.report, job.args, outputs)
+            for key, (job, outputs) in queries.items()
+        }
+        finished = {key: future.result() for key, future in futures.items()}
+
+    results = []
+    for job in jobs:
+        size, paths = finished[job.query_key()]
+        path = None
+        if job.output is not None:
+            _, outputs = queries[job.query_key()]
+            path = paths[outputs.index((job.output, job.fmt, job.compress))]
+        results.append((job, size, path))
+    return results
+
+
+def nightly_jobs(db_path: str, output_dir: str, fmt: str = "csv") -> list[ReportJob]:
+    """
+    Builds the nightly report list: climbers per nationality, mountains
+    per country and climbers per mountain for every year with expeditions.
+
+    Args:
+        db_path (str): Path to the SQLite database.
+        output_dir (str): Directory the reports are written to.
+        fmt (str): Export format, see exporter.FORMATS.
+
+    Returns:
+        list[ReportJob]: The jobs, ready for run_batch.
+    """
+    connection = sqlite3.connect(db_path)
+    cursor = connection.cursor()
+    jobs = []
+
+    cursor.execute("SELECT DISTINCT nationality FROM climbers ORDER BY 1")
+    for (nationality,) in cursor.fetchall():
+        path = os.path.join(output_dir, f"Climbers in country {nationality}.{fmt}")
+        jobs.append(ReportJob("get_climbers_from_country", (nationality,), path, fmt))
+
+    try:
+        # Includes countries that are only the second country of a border peak
+        cursor.execute("SELECT DISTINCT country FROM mountain_countries ORDER BY 1")
+    except sqlite3.OperationalError:
+        cursor.execute("SELECT DISTINCT country FROM mountains ORDER BY 1")
+    for (country,) in cursor.fetchall():
+        path = os.path.join(output_dir, f"Mountains in country {country}.{fmt}")
+        jobs.append(ReportJob("get_mountains_in_country", (country,), path, fmt))
+
+    cursor.execute(
+        "SELECT DISTINCT m.rank, m.name, m.country, m.height, m.prominence, "
+        "m.range, CAST(substr(e.date, 1, 4) AS INTEGER) FROM mountains m "
+        "JOIN expeditions e ON e.mountain_id = m.rank ORDER BY 1, 7"
+    )
+    for *row, year in cursor.fetchall():
+        mountain = Mountain(*row)
+        start, end = datetime(year, 1, 1), datetime(year, 12, 31)
+        path = os.path.join(
+            output_dir, f"Climbers mountain {mountain.name} in {year}.{fmt}"
+        )
+        jobs.append(
+            ReportJob(
+                "get_climbers_that_climbed_mountain_between",
+                (mountain, start, end),
+                path,
+                fmt,
+            )
+        )
+
+    connection.close()
+    return jobs
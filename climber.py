@@ -56,7 +56,7 @@ class Climber:
             f"nationality={self.nationality})"
         )
 
-    def get_age(self, at_date: date = date.today()) -> int:
+    def get_age(self, at_date: date = None) -> int:
         """
         Calculates the climber's age on a given date.
 
@@ -66,6 +66,8 @@ class Climber:
         Returns:
             int: Age of the climber at the specified date.
         """
+        if at_date is None:
+            at_date = date.today()
         return (
             at_date.year
             - self.date_of_birth.year
@@ -92,13 +94,23 @@ class Climber:
             and self.nationality == climber.nationality
         )
 
-    def get_expedition(self) -> "Expedition":
+    def get_expedition(self, lazy: bool = False) -> "Expedition":
         """
         Retrieves the Expedition object associated with this climber.
 
+        Args:
+            lazy (bool): Return a reference that only loads the expedition
+                when an attribute other than id is read, together with all
+                other references waiting to be loaded (see lazyreference).
+
         Returns:
             Expedition: The expedition the climber was part of.
         """
+        if lazy:
+            from lazyreference import ExpeditionReference
+
+            return ExpeditionReference(self.expedition_id)
+
         from climbersapp import (
             get_expedition_by_id,
         )  # Delayed import to avoid circular imports
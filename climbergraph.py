@@ -0,0 +1,233 @@
+import sqlite3
+from array import array
+
+# A climber's identity, the same fields Climber.is_same_climber compares:
+# (first_name, last_name, nationality, date_of_birth)
+Identity = tuple[str, str, str, str]
+
+
+class ClimberGraph:
+    """
+    Network of climbers who took part in the same expeditions.
+
+    Climber rows are deduplicated by identity (see Climber.is_same_climber),
+    so every person is one node. Two nodes are connected when they shared
+    at least one expedition, weighted by the number of shared expeditions.
+
+    Edges are stored as compressed sparse row (CSR) arrays, which the
+    queries read from. Edges added by update() are kept in a small delta
+    dict until the next query merges them into new CSR arrays.
+
+    Attributes:
+        identities (list[Identity]): Identity of every node, by node id.
+        last_climber_id (int): Highest climbers.id that has been processed.
+    """
+
+    def __init__(self) -> None:
+        """Initializes an empty graph. Call update() to load climbers."""
+        self.identities = []
+        self.last_climber_id = 0
+        self._node_ids = {}
+        self._delta = {}  # (node, node) -> shared expeditions not yet in CSR
+        self._indptr = array("q", [0])
+        self._indices = array("q")
+        self._weights = array("q")
+
+    @classmethod
+    def build(cls, cursor: sqlite3.Cursor) -> "ClimberGraph":
+        """
+        Builds the graph from the climbers table in one pass.
+
+        Args:
+            cursor (sqlite3.Cursor): Cursor on the database.
+
+        Returns:
+            ClimberGraph: The built graph.
+        """
+        graph = cls()
+        graph.update(cursor)
+        return graph
+
+    def update(self, cursor: sqlite3.Cursor) -> int:
+        """
+        Adds the climbers inserted since the last update, for example after
+        an ExpeditionWriter flush. Only their expeditions are read again.
+
+        Args:
+            cursor (sqlite3.Cursor): Cursor on the database.
+
+        Returns:
+            int: Number of new climber rows.
+        """
+        cursor.execute(
+            "SELECT id, expedition_id FROM climbers WHERE id > ?",
+            (self.last_climber_id,),
+        )
+        new_rows = cursor.fetchall()
+        if not new_rows:
+            return 0
+        new_ids = {row[0] for row in new_rows}
+        expedition_ids = sorted({row[1] for row in new_rows})
+
+        # Read every member of the touched expeditions, grouped by expedition
+        members = {}
+        for start in range(0, len(expedition_ids), 500):
+            chunk = expedition_ids[start:start + 500]
+            cursor.execute(
+                "SELECT id, first_name, last_name, nationality, date_of_birth, "
+                "expedition_id FROM climbers "
+                f"WHERE expedition_id IN ({', '.join('?' * len(chunk))}) "
+                "ORDER BY expedition_id, id",
+                chunk,
+            )
+            for climber_id, *identity, expedition_id in cursor.fetchall():
+                node = self._node_for(tuple(identity))
+                members.setdefault(expedition_id, []).append(
+                    (node, climber_id in new_ids)
+                )
+
+        # Count a pair once per expedition, unless both climbers were already
+        # members of it before this update (then it was counted back then)
+        for rows in members.values():
+            old_nodes = {node for node, is_new in rows if not is_new}
+            ordered = sorted({node for node, _ in rows})
+            for i, a in enumerate(ordered):
+                for b in ordered[i + 1:]:
+                    if a not in old_nodes or b not in old_nodes:
+                        self._add_edge(a, b)
+
+        self.last_climber_id = max(self.last_climber_id, max(new_ids))
+        return len(new_rows)
+
+    def _node_for(self, identity: Identity) -> int:
+        """Returns the node id of an identity, adding it when it is new."""
+        node = self._node_ids.get(identity)
+        if node is None:
+            node = len(self.identities)
+            self._node_ids[identity] = node
+            self.identities.append(identity)
+        return node
+
+    def _add_edge(self, a: int, b: int) -> None:
+        """Adds one shared expedition between two nodes (a < b) to the delta."""
+        self._delta[(a, b)] = self._delta.get((a, b), 0) + 1
+
+    def _compile(self) -> None:
+        """Merges the delta into new CSR arrays, then drops the delta."""
+        if not self._delta and len(self._indptr) == len(self.identities) + 1:
+            return
+        extra = {}
+        for (a, b), weight in self._delta.items():
+            extra.setdefault(a, {})[b] = weight
+            extra.setdefault(b, {})[a] = weight
+
+        old_nodes = len(self._indptr) - 1
+        indptr = array("q", [0])
+        indices = array("q")
+        weights = array("q")
+        for node in range(len(self.identities)):
+            start = end = 0
+            if node < old_nodes:
+                start, end = self._indptr[node], self._indptr[node + 1]
+            added = extra.get(node)
+            if added is None:
+                indices.extend(self._indices[start:end])
+                weights.extend(self._weights[start:end])
+            else:
+                neighbours = dict(zip(self._indices[start:end], self._weights[start:end]))
+                for neighbour, weight in added.items():
+                    neighbours[neighbour] = neighbours.get(neighbour, 0) + weight
+                for neighbour in sorted(neighbours):
+                    indices.append(neighbour)
+                    weights.append(neighbours[neighbour])
+            indptr.append(len(indices))
+        self._indptr, self._indices, self._weights = indptr, indices, weights
+        self._delta = {}
+
+    def node_count(self) -> int:
+        """Returns the number of distinct climbers."""
+        return len(self.identities)
+
+    def edge_count(self) -> int:
+        """Returns the number of distinct climber pairs that climbed together."""
+        self._compile()
+        return len(self._indices) // 2
+
+    def degree(self, identity: Identity) -> int:
+        """
+        Returns the number of distinct partners of a climber.
+
+        Args:
+            identity (Identity): (first_name, last_name, nationality, date_of_birth)
+        """
+        self._compile()
+        node = self._node_ids[identity]
+        return self._indptr[node + 1] - self._indptr[node]
+
+    def frequent_partners(
+        self, identity: Identity, n: int = 5
+    ) -> list[tuple[Identity, int]]:
+        """
+        Returns the climbers who shared the most expeditions with a climber.
+
+        Args:
+            identity (Identity): (first_name, last_name, nationality, date_of_birth)
+            n (int): Number of partners to return.
+
+        Returns:
+            list[tuple[Identity, int]]: Partners with their shared expeditions.
+        """
+        self._compile()
+        node = self._node_ids[identity]
+        start, end = self._indptr[node], self._indptr[node + 1]
+        partners = sorted(
+            zip(self._indices[start:end], self._weights[start:end]),
+            key=lambda pair: (-pair[1], pair[0]),
+        )
+        return [(self.identities[p], weight) for p, weight in partners[:n]]
+
+    def degree_ranking(self, n: int = 10) -> list[tuple[Identity, int]]:
+        """
+        Returns the climbers with the most distinct partners.
+
+        Args:
+            n (int): Number of climbers to return.
+
+        Returns:
+            list[tuple[Identity, int]]: Climbers with their number of partners.
+        """
+        self._compile()
+        indptr = self._indptr
+        degrees = sorted(
+            range(len(self.identities)),
+            key=lambda node: (indptr[node] - indptr[node + 1], node),
+        )
+        return [
+            (self.identities[node], indptr[node + 1] - indptr[node])
+            for node in degrees[:n]
+        ]
+
+    def connected_components(self) -> list[list[Identity]]:
+        """
+        Returns groups of climbers linked through shared expeditions,
+        largest group first.
+        """
+        self._compile()
+        parent = list(range(len(self.identities)))
+
+        def find(node):
+            while parent[node] != node:
+                parent[node] = parent[parent[node]]
+                node = parent[node]
+            return node
+
+        for node in range(len(self.identities)):
+            for neighbour in self._indices[self._indptr[node]:self._indptr[node + 1]]:
+                root_a, root_b = find(node), find(neighbour)
+                if root_a != root_b:
+                    parent[max(root_a, root_b)] = min(root_a, root_b)
+
+        components = {}
+        for node in range(len(self.identities)):
+            components.setdefault(find(node), []).append(self.identities[node])
+        return sorted(components.values(), key=lambda group: -len(group))
@@ -4,6 +4,9 @@ import sqlite3
 import json
 from datetime import datetime
 
+import schema
+from sketches import ExpeditionSketches
+
 # Do NOT import Reporter or Mountain here to avoid circular imports
 # Import them only inside __main__ or function scope if needed
 
@@ -15,18 +18,96 @@ json_path = os.path.join(sys.path[0], "expeditions.json")
 connection = sqlite3.connect(db_path)
 cursor = connection.cursor()
 
+# Metadata key of the checkpoint written by load_json_and_insert
+INGEST_CHECKPOINT = "ingest_checkpoint"
+
 
 def is_database_empty():
     cursor.execute("SELECT COUNT(*) FROM climbers")
     return cursor.fetchone()[0] == 0
 
 
-def load_json_and_insert():
+def get_ingest_checkpoint():
+    """
+    Returns the checkpoint of an unfinished load_json_and_insert, as a dict
+    with the dump it was loading ("source") and the number of expeditions
+    from it that are committed ("position"), or None if no load is pending.
+    """
+    checkpoint = schema.get_metadata(cursor, INGEST_CHECKPOINT)
+    return json.loads(checkpoint) if checkpoint is not None else None
+
+
+def load_json_and_insert(segment_size=1000):
+    """
+    Loads expeditions.json into the database in segments of segment_size
+    expeditions. Each segment is committed together with a checkpoint in
+    the metadata table, so after a crash a new call resumes after the last
+    committed segment instead of starting over. The checkpoint is removed
+    once the whole dump is loaded.
+    """
     with open(json_path, "r", encoding="utf-8") as f:
         expeditions = json.load(f)
+    source = {
+        "path": os.path.basename(json_path),
+        "size": os.path.getsize(json_path),
+    }
+
+    schema.ensure_report_schema(cursor)
+    schema.ensure_metadata_table(cursor)
+
+    start = 0
+    checkpoint = get_ingest_checkpoint()
+    if checkpoint is not None:
+        if checkpoint["source"] != source:
+            raise ValueError(
+                f"An unfinished load of {checkpoint['source']['path']} is pending; "
+                f"it cannot be resumed from a different dump."
+            )
+        start = checkpoint["position"]
+
+    seen_mountains = set()
+    # Stored sketches already cover the segments committed before a crash
+    ExpeditionSketches.ensure_stored(cursor)
+    connection.commit()
+    for position in range(start, len(expeditions), segment_size):
+        segment = expeditions[position:position + segment_size]
+        sketches = ExpeditionSketches()  # Only this segment's items are saved
+        try:
+            for expedition in segment:
+                insert_expedition(cursor, expedition, seen_mountains, sketches)
+            end = position + len(segment)
+            if end < len(expeditions):
+                schema.set_metadata(
+                    cursor,
+                    INGEST_CHECKPOINT,
+                    json.dumps({"source": source, "position": end}),
+                )
+            else:
+                schema.delete_metadata(cursor, INGEST_CHECKPOINT)
+            sketches.save(cursor)
+            schema.bump_dataset_version(cursor)
+            connection.commit()
+        except Exception:
+            connection.rollback()  # Drop the unfinished segment
+            raise
+
 
-    for expedition in expeditions:
-        m = expedition["mountain"]
+def insert_expedition(cursor, expedition, seen_mountains=None, sketches=None):
+    """
+    Inserts one expedition record (in the expeditions.json layout) together
+    with its mountain and climbers, using the given cursor. Does not commit.
+    Returns the id of the inserted expedition.
+
+    Pass the same seen_mountains set for a whole load: the mountains row is
+    not written again for ranks in it, since each mountain repeats across
+    many expeditions. Its countries are always added.
+    When sketches (an ExpeditionSketches) is given, it is updated too.
+    Both are only updated once every row is written, so a record that
+    fails halfway can be rolled back (e.g. to a savepoint) without them.
+    """
+    m = expedition["mountain"]
+    new_mountain = seen_mountains is None or m["rank"] not in seen_mountains
+    if new_mountain:
         cursor.execute(
             "INSERT OR IGNORE INTO mountains (rank, name, country, height, prominence, range) "
             "VALUES (?, ?, ?, ?, ?, ?)",
@@ -39,44 +120,75 @@ def load_json_and_insert():
                 m["range"],
             ),
         )
+    # Always cheap, and a later record may list a country the first did not
+    cursor.executemany(
+        "INSERT OR IGNORE INTO mountain_countries (country, mountain_id) "
+        "VALUES (?, ?)",
+        [(country, m["rank"]) for country in m["countries"]],
+    )
 
-        duration_str = expedition["duration"]
-        h, m_ = map(int, duration_str.replace("H", ":").split(":"))
-        duration_min = h * 60 + m_ #grabs duration from json and splits
+    duration_str = expedition["duration"]
+    h, m_ = map(int, duration_str.replace("H", ":").split(":"))
+    duration_min = h * 60 + m_ #grabs duration from json and splits
 
-        exp_date = datetime.strptime(expedition["date"], "%Y-%m-%d")
+    exp_date = datetime.strptime(expedition["date"], "%Y-%m-%d")
+    cursor.execute(
+        "INSERT INTO expeditions (id, name, mountain_id, start_location, date, country, duration, success) "
+        "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+        (
+            expedition.get("id"),  # None lets SQLite pick the next id
+            expedition["name"],
+            expedition["mountain"]["rank"],
+            expedition["start"],
+            exp_date.strftime("%Y-%m-%d"),
+            expedition["country"],
+            duration_min,
+            int(expedition["success"]),
+        ),
+    )
+    expedition_id = cursor.lastrowid
+
+    births = []
+    for climber in expedition["climbers"]:
+        dob = datetime.strptime(climber["date_of_birth"], "%d-%m-%Y").strftime(
+            "%Y-%m-%d"
+        )
         cursor.execute(
-            "INSERT INTO expeditions (id, name, mountain_id, start_location, date, country, duration, success) "
-            "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            "INSERT INTO climbers (first_name, last_name, nationality, date_of_birth, expedition_id) "
+            "VALUES (?, ?, ?, ?, ?)",
             (
-                expedition["id"],
-                expedition["name"],
-                expedition["mountain"]["rank"],
-                expedition["start"],
-                exp_date.strftime("%Y-%m-%d"),
-                expedition["country"],
-                duration_min,
-                int(expedition["success"]),
+                climber["first_name"],
+                climber["last_name"],
+                climber["nationality"],
+                dob,
+                expedition_id,
             ),
         )
+        births.append((climber, dob))
 
-        for climber in expedition["climbers"]:
-            dob = datetime.strptime(climber["date_of_birth"], "%d-%m-%Y").strftime(
-                "%Y-%m-%d"
-            )
-            cursor.execute(
-                "INSERT INTO climbers (first_name, last_name, nationality, date_of_birth, expedition_id) "
-                "VALUES (?, ?, ?, ?, ?)",
-                (
-                    climber["first_name"],
-                    climber["last_name"],
-                    climber["nationality"],
-                    dob,
-                    expedition["id"],
-                ),
-            )
+    schema.add_to_expedition_bucket(
+        cursor,
+        expedition["mountain"]["rank"],
+        exp_date.strftime("%Y-%m-%d"),
+        int(expedition["success"]),
+        len(expedition["climbers"]),
+    )
+    schema.add_to_duration_count(
+        cursor,
+        expedition["mountain"]["rank"],
+        int(expedition["success"]),
+        duration_min,
+    )
 
-    connection.commit()
+    if seen_mountains is not None and new_mountain:
+        seen_mountains.add(m["rank"])
+    if sketches is not None:
+        sketches.add_expedition(expedition_id, expedition["country"])
+        for climber, dob in births:
+            sketches.add_climber(
+                climber["first_name"], climber["last_name"], climber["nationality"], dob
+            )
+    return expedition_id
 
 
 def get_expedition_by_id(exp_id):
@@ -114,6 +226,35 @@ def get_mountain_by_rank(rank):
     return None
 
 
+def _rows_by_keys(table, column, keys):
+    """Fetches the rows whose column is in keys, with one IN query per chunk."""
+    keys = list(keys)
+    rows = []
+    # Stay well below SQLite's limit on the number of query parameters
+    for i in range(0, len(keys), 500):
+        chunk = keys[i:i + 500]
+        placeholders = ", ".join("?" * len(chunk))
+        cursor.execute(
+            f"SELECT * FROM {table} WHERE {column} IN ({placeholders})", chunk
+        )
+        rows.extend(cursor.fetchall())
+    return rows
+
+
+def get_expeditions_by_ids(ids):
+    """Returns the expeditions with the given ids, as a dict by id."""
+    from expedition import Expedition
+
+    return {row[0]: Expedition(*row) for row in _rows_by_keys("expeditions", "id", ids)}
+
+
+def get_mountains_by_ranks(ranks):
+    """Returns the mountains with the given ranks, as a dict by rank."""
+    from mountain import Mountain
+
+    return {row[0]: Mountain(*row) for row in _rows_by_keys("mountains", "rank", ranks)}
+
+
 def get_expeditions_by_mountain_rank(rank):
     cursor.execute("SELECT * FROM expeditions WHERE mountain_id = ?", (rank,))
     rows = cursor.fetchall()
@@ -124,8 +265,13 @@ def get_expeditions_by_mountain_rank(rank):
 
 # === MAIN EXECUTION ===
 if __name__ == "__main__":
-    if is_database_empty():
+    if is_database_empty() or get_ingest_checkpoint() is not None:
         load_json_and_insert()
+    else:
+        # Existing databases get the report tables and indexes here, since
+        # Reporter only reads and never creates them
+        schema.ensure_report_schema(cursor)
+        connection.commit()
 
     # Delayed import to avoid circular import
     from climbersreporter import Reporter #take the blueprint from reporter
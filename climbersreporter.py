@@ -1,15 +1,66 @@
 import os
 import sys
 import sqlite3
-import csv
+from contextlib import contextmanager
 from datetime import datetime
+from fractions import Fraction
+from pathlib import Path
 
 from mountain import Mountain
 from expedition import Expedition
 from climber import Climber
+from climbergraph import ClimberGraph
+import exporter
+import memorybudget
+import schema
+from sketches import ExpeditionSketches
 
 # Set up connection to SQLite database
 
+# Age of climber c on the date of expedition e, in whole years. Same rule as
+# Climber.get_age: subtract one year if the birthday has not been reached yet.
+AGE_AT_EXPEDITION = (
+    "(CAST(substr(e.date, 1, 4) AS INTEGER)"
+    " - CAST(substr(c.date_of_birth, 1, 4) AS INTEGER)"
+    " - (substr(e.date, 6, 5) < substr(c.date_of_birth, 6, 5)))"
+)
+
+DEMOGRAPHIC_GROUPS = ("mountain", "nationality")
+
+DURATION_GROUPS = ("mountain", "success")
+
+# Leaderboard metrics: the table they rank and the SQL for the ranked value.
+# Counting metrics only count successful expeditions when asked to.
+LEADERBOARD_METRICS = {
+    "height": ("mountains", "m.height"),
+    "prominence": ("mountains", "m.prominence"),
+    "expeditions": (
+        "mountains",
+        "(SELECT COUNT(*) FROM expeditions e"
+        " WHERE e.mountain_id = m.rank AND (e.success = 1 OR :all = 1))",
+    ),
+    "duration": ("expeditions", "e.duration"),
+    "climbers": (
+        "expeditions",
+        "(SELECT COUNT(*) FROM climbers c WHERE c.expedition_id = e.id)",
+    ),
+}
+
+LEADERBOARD_PARTITIONS = {
+    "mountains": {"country": "m.country", "range": "m.range"},
+    "expeditions": {
+        "country": "e.country",
+        "mountain": "e.mountain_id",
+        "year": "substr(e.date, 1, 4)",
+        "success": "e.success",
+    },
+}
+
+# Read-replica modes for Reporter.initialize_database:
+#   "memory" copies the database into RAM with the SQLite backup API,
+#   "mmap" reads the file in place through a read-only memory map.
+REPLICA_MODES = (None, "memory", "mmap")
+MMAP_SIZE = 1024 * 1024 * 1024
 
 
 class Reporter:
@@ -20,10 +71,213 @@ class Reporter:
 
     chimney = 5
 
-    def initialize_database(self, db_path):
-        connection = sqlite3.connect(db_path)
+    # Limits for list reports; None keeps every result fully in memory
+    memory_budget = None
+    last_query_stats = None
+
+    # Results of cached() calls; None until enable_result_cache is called
+    result_cache = None
+
+    def initialize_database(
+        self, db_path, replica: str = None, check_same_thread: bool = True
+    ):
+        """
+        Opens the database. Reporting workers that only read can pass
+        replica="memory" or replica="mmap" to query a read-only replica
+        instead; call refresh_replica() to pick up newer data.
+
+        Pass check_same_thread=False to let another thread use this
+        Reporter, for example a Warmup running at startup. The threads must
+        still not use it at the same time.
+        """
+        if replica not in REPLICA_MODES:
+            raise ValueError("replica must be None, 'memory' or 'mmap'")
+        self.db_path = db_path
+        self.replica = replica
+        self.check_same_thread = check_same_thread
+        self._schema_ready = {}
+        if replica is None:
+            self.connection = sqlite3.connect(
+                db_path, check_same_thread=check_same_thread
+            )
+            self.cursor = self.connection.cursor()
+            self.replica_version = None
+        else:
+            self._swap_in_replica(self._open_replica())
+
+    def _open_read_only(self) -> sqlite3.Connection:
+        """Opens the on-disk database so that it can never be written to."""
+        uri = Path(self.db_path).resolve().as_uri() + "?mode=ro"
+        return sqlite3.connect(
+            uri, uri=True, check_same_thread=self.check_same_thread
+        )
+
+    def _open_replica(self) -> sqlite3.Connection:
+        """Builds a fully prepared replica connection for the current mode."""
+        source = self._open_read_only()
+        if self.replica == "memory":
+            connection = sqlite3.connect(
+                ":memory:", check_same_thread=self.check_same_thread
+            )
+            source.backup(connection)
+            source.close()
+            # The copy is private, so it can get the report indexes up front
+            schema.ensure_report_schema(connection.cursor())
+            connection.commit()
+        else:
+            connection = source
+            connection.execute(f"PRAGMA mmap_size = {MMAP_SIZE}")
+        connection.execute("PRAGMA query_only = ON")
+        return connection
+
+    def _swap_in_replica(self, connection: sqlite3.Connection) -> None:
+        """Replaces the current connection with a prepared replica."""
+        old = getattr(self, "connection", None)
+        self.connection = connection
         self.cursor = connection.cursor()
-            
+        self.replica_version = schema.get_dataset_version(self.cursor)
+        self._schema_ready = {}
+        if old is not None:
+            old.close()
+
+    def refresh_replica(self) -> bool:
+        """
+        Reloads the replica when the on-disk dataset version has changed.
+        The new replica is built completely before it replaces the old one,
+        so queries never see a half-loaded copy.
+
+        Returns:
+            bool: True if the replica was reloaded.
+        """
+        if self.replica is None:
+            return False
+        probe = self._open_read_only()
+        try:
+            version = schema.get_dataset_version(probe.cursor())
+        finally:
+            probe.close()
+        if version == self.replica_version:
+            return False
+        self._swap_in_replica(self._open_replica())
+        return True
+
+    def _has_schema(self, setup) -> bool:
+        """
+        Checks whether the tables and indexes of one of the schema.ensure_*
+        helpers exist. Reporter never creates them, so a report never waits
+        for a write lock: ingest does (ExpeditionWriter, load_json_and_insert
+        and climbersapp at startup). Returns False when they are missing,
+        so callers can fall back to plain queries. Only a positive answer is
+        cached, so the check is repeated until ingest has created them.
+        """
+        name = setup.__name__
+        if not self._schema_ready.get(name):
+            try:
+                self._schema_ready[name] = schema.has_schema(self.cursor, setup)
+            except sqlite3.OperationalError:
+                return False  # E.g. locked right now; check again next time
+        return self._schema_ready[name]
+
+    def _has_time_index(self) -> bool:
+        """Checks that the (mountain_id, date) index and rollup table exist."""
+        return self._has_schema(schema.ensure_time_index)
+
+    def _has_duration_summary(self) -> bool:
+        """Checks that the duration index and duration_counts table exist."""
+        return self._has_schema(schema.ensure_duration_summary)
+
+    def set_memory_budget(
+        self, max_rows: int = None, max_bytes: int = None, batch_size: int = 500
+    ) -> None:
+        """
+        Limits how much of a list report is kept in memory. Results over
+        the budget are spilled to a temporary file and returned as a
+        SpilledResult, which can be iterated and exported like a tuple.
+        Call without arguments to remove the limits.
+        """
+        if max_rows is None and max_bytes is None:
+            self.memory_budget = None
+        else:
+            self.memory_budget = memorybudget.MemoryBudget(
+                max_rows, max_bytes, batch_size
+            )
+
+    def _materialize(self, build):
+        """
+        Turns the rows of the last executed query into model objects within
+        the memory budget, and records the QueryStats in last_query_stats.
+        """
+        result, self.last_query_stats = memorybudget.materialize(
+            self.cursor, build, self.memory_budget
+        )
+        return result
+
+    @staticmethod
+    def _climber_from_row(row) -> Climber:
+        """Builds a Climber from a full row of the climbers table."""
+        return Climber(
+            id=row[0],
+            first_name=row[1],
+            last_name=row[2],
+            nationality=row[3],
+            date_of_birth=(
+                datetime.strptime(row[4], "%Y-%m-%d").date()
+                if isinstance(row[4], str)
+                else row[4]
+            ),
+            expedition_id=row[5],
+        )
+
+    def enable_result_cache(self) -> None:
+        """
+        Turns on the result cache used by cached(). Cached results are
+        dropped as soon as the dataset version changes.
+        """
+        self.result_cache = {}
+        self._result_cache_version = None
+
+    def cached(self, report: str, **kwargs):
+        """
+        Calls a report method and caches its result for later calls with
+        the same arguments. Without enable_result_cache this just calls the
+        method. Results spilled to disk under a memory budget are never
+        cached, since each caller may close() the one it gets.
+
+        Args:
+            report (str): Name of the report method, e.g. "highest_mountain".
+            **kwargs: Arguments for the method, passed by name.
+        """
+        method = getattr(self, report)
+        if self.result_cache is None:
+            return method(**kwargs)
+        version = self.dataset_version()
+        if version != self._result_cache_version:
+            self.result_cache.clear()
+            self._result_cache_version = version
+        key = (report, repr(sorted(kwargs.items())))
+        if key not in self.result_cache:
+            result = method(**kwargs)
+            if isinstance(result, memorybudget.SpilledResult):
+                return result
+            self.result_cache[key] = result
+        return self.result_cache[key]
+
+    def dataset_version(self) -> int:
+        """Returns the dataset version published by the last ingest commit."""
+        return schema.get_dataset_version(self.cursor)
+
+    @contextmanager
+    def snapshot(self):
+        """
+        Runs several report calls against one consistent view of the data,
+        even while an ExpeditionWriter keeps committing. Yields the dataset
+        version that the view belongs to.
+        """
+        self.cursor.execute("BEGIN")
+        try:
+            yield schema.get_dataset_version(self.cursor)
+        finally:
+            self.connection.rollback()
 
     def total_amount_of_climbers(self) -> int:
         """Returns the total number of climbers in the database."""
@@ -35,8 +289,14 @@ class Reporter:
             print("Database error:", e)
             return 0
 
-    def total_amount_of_unique_climbers(self) -> int:
-        """Returns the total number of unique climbers based on identity fields."""
+    def total_amount_of_unique_climbers(self, approximate: bool = False) -> int:
+        """
+        Returns the total number of unique climbers based on identity fields.
+        With approximate=True it reads a HyperLogLog sketch instead (about
+        1% error) without scanning the climbers table.
+        """
+        if approximate:
+            return self._approximate_statistics().climbers.count()
         try:
             self.cursor.execute(
                 """
@@ -51,6 +311,62 @@ class Reporter:
             print("Database error:", e)
             return 0
 
+    def _approximate_statistics(self) -> ExpeditionSketches:
+        """
+        Returns the sketches stored by ingest, reloaded when the dataset
+        version changes. When none are stored yet they are built in memory.
+        """
+        version = self.dataset_version()
+        if getattr(self, "_sketches_version", None) != version:
+            self._sketches = ExpeditionSketches.load_or_build(self.cursor)
+            self._sketches_version = version
+        return self._sketches
+
+    def count_climbers_from_country(
+        self, country: str, approximate: bool = False
+    ) -> int:
+        """
+        Returns the number of climbers from the given country. With
+        approximate=True it reads a count-min sketch, which never
+        undercounts.
+        """
+        if approximate:
+            return self._approximate_statistics().nationalities.estimate(country)
+        self.cursor.execute(
+            "SELECT COUNT(*) FROM climbers WHERE LOWER(nationality) = LOWER(?)",
+            (country,),
+        )
+        return self.cursor.fetchone()[0]
+
+    def count_expeditions_in_country(
+        self, country: str, approximate: bool = False
+    ) -> int:
+        """
+        Returns the number of expeditions that took place in the given
+        country. With approximate=True it reads a count-min sketch.
+        """
+        if approximate:
+            return self._approximate_statistics().countries.estimate(country)
+        self.cursor.execute(
+            "SELECT COUNT(*) FROM expeditions WHERE LOWER(country) = LOWER(?)",
+            (country,),
+        )
+        return self.cursor.fetchone()[0]
+
+    def sample_expeditions(self, n: int = 10) -> tuple[Expedition, ...]:
+        """
+        Returns up to n expeditions from the random sample kept by ingest,
+        without scanning the expeditions table.
+        """
+        ids = self._approximate_statistics().expeditions.items[:n]
+        if not ids:
+            return ()
+        self.cursor.execute(
+            f"SELECT * FROM expeditions WHERE id IN ({', '.join('?' * len(ids))})",
+            ids,
+        )
+        return tuple(Expedition(*row) for row in self.cursor.fetchall())
+
     def highest_mountain(self) -> Mountain:
         """Returns the highest mountain based on height."""
         self.cursor.execute(
@@ -97,6 +413,124 @@ class Reporter:
 
         return longest, shortest
 
+    def _duration_counts(self) -> str:
+        """
+        Returns the source of duration statistics: the duration_counts
+        table, or the same counts computed from expeditions when ingest has
+        not created the table yet.
+        """
+        if self._has_duration_summary():
+            return "duration_counts"
+        return (
+            "(SELECT mountain_id, success, duration, COUNT(*) AS expeditions "
+            "FROM expeditions GROUP BY mountain_id, success, duration)"
+        )
+
+    @staticmethod
+    def _quantiles(counts: list, total: int, percentiles) -> list[int]:
+        """
+        Returns nearest-rank percentiles from (duration, expeditions) pairs
+        in ascending duration order.
+        """
+        # Exact arithmetic: p / 100 * total in floats can land just above an
+        # integer, e.g. 7 / 100 * 100 == 7.000000000000001
+        ranks = [max(1, -(-Fraction(str(p)) * total // 100)) for p in percentiles]
+        result = [None] * len(ranks)
+        seen = 0
+        for duration, expeditions in counts:
+            seen += expeditions
+            for i, rank in enumerate(ranks):
+                if result[i] is None and seen >= rank:
+                    result[i] = duration
+            if None not in result:
+                break
+        return result
+
+    def duration_percentile(
+        self,
+        percentile: float,
+        mountain: Mountain = None,
+        only_succesful: bool = False,
+    ) -> int:
+        """
+        Returns a duration percentile in minutes (nearest rank), e.g. 50 for
+        the median, optionally for one mountain and/or only the successful
+        expeditions. Returns None when there are no expeditions.
+        """
+        if not 0 <= percentile <= 100:
+            raise ValueError("percentile must be between 0 and 100")
+        query = f"SELECT duration, SUM(expeditions) FROM {self._duration_counts()}"
+        conditions, params = [], []
+        if mountain is not None:
+            conditions.append("mountain_id = ?")
+            params.append(mountain.rank)
+        if only_succesful:
+            conditions.append("success = 1")
+        if conditions:
+            query += " WHERE " + " AND ".join(conditions)
+        self.cursor.execute(query + " GROUP BY duration ORDER BY duration", params)
+        counts = self.cursor.fetchall()
+        total = sum(expeditions for _, expeditions in counts)
+        if total == 0:
+            return None
+        return self._quantiles(counts, total, (percentile,))[0]
+
+    def duration_statistics(
+        self,
+        group_by: str = "mountain",
+        only_succesful: bool = False,
+        to_format: str = None,
+    ) -> tuple[tuple, ...]:
+        """
+        Returns expedition duration statistics per mountain or per success
+        status, without sorting the expeditions.
+
+        Each entry is (group, expeditions, shortest, longest, mean, median,
+        p90), where group is the mountain name or True/False for success.
+        Durations are in minutes, or strings when to_format is given (see
+        Expedition.convert_duration); the mean is then rounded to a minute.
+        """
+        if group_by not in DURATION_GROUPS:
+            raise ValueError(f"group_by must be one of {', '.join(DURATION_GROUPS)}")
+        if group_by == "mountain":
+            self.cursor.execute(
+                f"""
+                SELECT m.name, d.duration, SUM(d.expeditions)
+                FROM {self._duration_counts()} d
+                JOIN mountains m ON m.rank = d.mountain_id
+                {"WHERE d.success = 1" if only_succesful else ""}
+                GROUP BY m.name, d.duration ORDER BY m.name, d.duration
+                """
+            )
+        else:
+            self.cursor.execute(
+                f"""
+                SELECT success, duration, SUM(expeditions)
+                FROM {self._duration_counts()}
+                {"WHERE success = 1" if only_succesful else ""}
+                GROUP BY success, duration ORDER BY success, duration
+                """
+            )
+
+        groups = {}
+        for group, duration, expeditions in self.cursor.fetchall():
+            groups.setdefault(group, []).append((duration, expeditions))
+
+        statistics = []
+        for group, counts in groups.items():
+            total = sum(expeditions for _, expeditions in counts)
+            mean = sum(d * expeditions for d, expeditions in counts) / total
+            median, p90 = self._quantiles(counts, total, (50, 90))
+            durations = [counts[0][0], counts[-1][0], mean, median, p90]
+            if to_format is not None:
+                durations = [
+                    Expedition.format_duration(round(d), to_format) for d in durations
+                ]
+            if group_by == "success":
+                group = bool(group)
+            statistics.append((group, total, *durations))
+        return tuple(statistics)
+
     def expedition_with_most_climbers(self) -> Expedition:
         """Finds and returns the expedition with the most climbers."""
         self.cursor.execute(
@@ -189,85 +623,269 @@ class Reporter:
             """,
             (mountain.rank, start.strftime("%Y-%m-%d"), end.strftime("%Y-%m-%d")),
         )
-        rows = self.cursor.fetchall()
-        climbers = tuple(
-            Climber(
-                id=row[0],
-                first_name=row[1],
-                last_name=row[2],
-                nationality=row[3],
-                date_of_birth=(
-                    datetime.strptime(row[4], "%Y-%m-%d").date()
-                    if isinstance(row[4], str)
-                    else row[4]
-                ),
-                expedition_id=row[5],
-            )
-            for row in rows
-        )
+        climbers = self._materialize(self._climber_from_row)
 
         if to_csv:
             filename = (
                 f"Climbers mountain {mountain.name} between "
                 f"{start.strftime('%Y-%m-%d')} and {end.strftime('%Y-%m-%d')}.csv"
             )
-            with open(filename, "w", newline="", encoding="utf-8") as f:
-                writer = csv.writer(f)
-                writer.writerow(
-                    [
-                        "id",
-                        "first_name",
-                        "last_name",
-                        "nationality",
-                        "date_of_birth",
-                        "expedition_id",
-                    ]
-                )
-                for c in climbers:
-                    writer.writerow(
-                        [
-                            c.id,
-                            c.first_name,
-                            c.last_name,
-                            c.nationality,
-                            c.date_of_birth.strftime("%Y-%m-%d"),
-                            c.expedition_id,
-                        ]
-                    )
+            exporter.export_report(climbers, filename, model=Climber)
 
         return climbers
 
+    def count_expeditions_between(
+        self,
+        start: datetime,
+        end: datetime,
+        mountain: Mountain = None,
+        only_succesful: bool = False,
+    ) -> int:
+        """
+        Counts the expeditions between two dates (inclusive), optionally
+        for one mountain and/or only the successful ones.
+        """
+        query = "SELECT COUNT(*) FROM expeditions WHERE date BETWEEN ? AND ?"
+        params = [start.strftime("%Y-%m-%d"), end.strftime("%Y-%m-%d")]
+        if mountain is not None:
+            query += " AND mountain_id = ?"
+            params.append(mountain.rank)
+        if only_succesful:
+            query += " AND success = 1"
+        self.cursor.execute(query, params)
+        return self.cursor.fetchone()[0]
+
+    def expedition_histogram(
+        self,
+        start: datetime,
+        end: datetime,
+        per: str = "year",
+        mountain: Mountain = None,
+    ) -> tuple[tuple[str, int, int, float], ...]:
+        """
+        Returns expedition counts per year or per month between two dates.
+
+        Each entry is (period, expeditions, successes, success_rate), where
+        period is "YYYY" or "YYYY-MM". The range is widened to whole months,
+        and periods without expeditions are left out.
+        """
+        if per not in ("year", "month"):
+            raise ValueError("per must be 'year' or 'month'")
+
+        if self._has_time_index():
+            source = "expedition_buckets"
+            sums = "SUM(expeditions), SUM(successes)"
+        else:
+            source = (
+                "(SELECT CAST(substr(date, 1, 4) AS INTEGER) AS year, "
+                "CAST(substr(date, 6, 2) AS INTEGER) AS month, "
+                "mountain_id, success FROM expeditions)"
+            )
+            sums = "COUNT(*), SUM(success)"
+        period = "year" if per == "year" else "year, month"
+
+        query = (
+            f"SELECT {period}, {sums} FROM {source} "
+            "WHERE (year, month) >= (?, ?) AND (year, month) <= (?, ?)"
+        )
+        params = [start.year, start.month, end.year, end.month]
+        if mountain is not None:
+            query += " AND mountain_id = ?"
+            params.append(mountain.rank)
+        query += f" GROUP BY {period} ORDER BY {period}"
+        self.cursor.execute(query, params)
+
+        histogram = []
+        for row in self.cursor.fetchall():
+            if per == "year":
+                label, expeditions, successes = str(row[0]), row[1], row[2]
+            else:
+                label = f"{row[0]:04}-{row[1]:02}"
+                expeditions, successes = row[2], row[3]
+            histogram.append(
+                (label, expeditions, successes, successes / expeditions)
+            )
+        return tuple(histogram)
+
+    def _demographic_column(self, group_by: str) -> str:
+        """Checks a group_by name and returns the column to group on."""
+        if group_by not in DEMOGRAPHIC_GROUPS:
+            raise ValueError(
+                f"group_by must be one of {', '.join(DEMOGRAPHIC_GROUPS)}"
+            )
+        return group_by
+
+    def _ages_at_expedition(self, only_succesful: bool) -> str:
+        """
+        Returns a subquery with one row per climber: the mountain name,
+        nationality, expedition id and age on the day of the expedition.
+        """
+        return f"""
+            SELECT c.id, c.nationality, m.name AS mountain, e.id AS expedition_id,
+                {AGE_AT_EXPEDITION} AS age
+            FROM climbers c
+            JOIN expeditions e ON c.expedition_id = e.id
+            JOIN mountains m ON e.mountain_id = m.rank
+            {"WHERE e.success = 1" if only_succesful else ""}
+        """
+
+    def youngest_and_oldest_summiteers(self) -> tuple[tuple[Climber, int], ...]:
+        """
+        Returns the youngest and oldest climber of a successful expedition,
+        each paired with their age on the day of the expedition.
+        """
+        result = []
+        for order in ("ASC", "DESC"):
+            self.cursor.execute(
+                f"""
+                SELECT c.*, a.age FROM climbers c
+                JOIN ({self._ages_at_expedition(True)}) a ON a.id = c.id
+                ORDER BY a.age {order}, c.id
+                LIMIT 1
+                """
+            )
+            row = self.cursor.fetchone()
+            if row is None:
+                raise ValueError("No successful expeditions found in the database.")
+            result.append((self._climber_from_row(row), row[6]))
+        return tuple(result)
+
+    def age_statistics(
+        self, group_by: str = "mountain", only_succesful: bool = False
+    ) -> tuple[tuple[str, int, int, int, float], ...]:
+        """
+        Returns age-at-expedition statistics per mountain or per nationality.
+
+        Each entry is (group, climbers, youngest, oldest, average_age).
+        """
+        column = self._demographic_column(group_by)
+        self.cursor.execute(
+            f"""
+            SELECT {column}, COUNT(*), MIN(age), MAX(age), AVG(age)
+            FROM ({self._ages_at_expedition(only_succesful)})
+            GROUP BY {column} ORDER BY {column}
+            """
+        )
+        return tuple(tuple(row) for row in self.cursor.fetchall())
+
+    def age_histogram(
+        self,
+        group_by: str = "mountain",
+        bucket_size: int = 10,
+        only_succesful: bool = False,
+    ) -> tuple[tuple[str, int, int], ...]:
+        """
+        Returns age-at-expedition histograms per mountain or per nationality.
+
+        Each entry is (group, bucket_start, climbers); a climber aged 37 falls
+        in bucket 30 with the default bucket size of 10 years.
+        """
+        if bucket_size < 1:
+            raise ValueError("bucket_size must be at least 1")
+        column = self._demographic_column(group_by)
+        self.cursor.execute(
+            f"""
+            SELECT {column}, (age / ?) * ? AS bucket, COUNT(*)
+            FROM ({self._ages_at_expedition(only_succesful)})
+            GROUP BY {column}, bucket ORDER BY {column}, bucket
+            """,
+            (bucket_size, bucket_size),
+        )
+        return tuple(tuple(row) for row in self.cursor.fetchall())
+
+    def top_k(
+        self,
+        metric: str,
+        k: int = 10,
+        partition_by: str = None,
+        only_succesful: bool = False,
+        ascending: bool = False,
+    ) -> tuple[tuple, ...]:
+        """
+        Returns a leaderboard of mountains or expeditions in a single query.
+
+        Mountains can be ranked by "height", "prominence" or "expeditions"
+        and partitioned by "country" or "range". Expeditions can be ranked by
+        "duration" or "climbers" and partitioned by "country", "mountain",
+        "year" or "success".
+
+        Ties share a rank and are all kept, so a partition can hold more
+        than k entries. Each entry is (partition, rank, value, object), where
+        partition is None when partition_by is not given.
+        """
+        if metric not in LEADERBOARD_METRICS:
+            raise ValueError(
+                f"metric must be one of {', '.join(LEADERBOARD_METRICS)}"
+            )
+        if k < 1:
+            raise ValueError("k must be at least 1")
+        table, value = LEADERBOARD_METRICS[metric]
+        partitions = LEADERBOARD_PARTITIONS[table]
+        if partition_by is not None and partition_by not in partitions:
+            raise ValueError(
+                f"partition_by for {metric} must be one of {', '.join(partitions)}"
+            )
+
+        alias, key = ("m", "rank") if table == "mountains" else ("e", "id")
+        partition = partitions[partition_by] if partition_by else "NULL"
+        where = ""
+        if table == "expeditions" and only_succesful:
+            where = "WHERE e.success = 1"
+        order = "ASC" if ascending else "DESC"
+
+        self.cursor.execute(
+            f"""
+            SELECT * FROM (
+                SELECT {alias}.*, {partition} AS partition_key, {value} AS value,
+                    RANK() OVER (
+                        PARTITION BY {partition} ORDER BY {value} {order}
+                    ) AS position
+                FROM {table} {alias}
+                {where}
+            )
+            WHERE position <= :k
+            ORDER BY partition_key, position, {key}
+            """,
+            {"k": k, "all": int(not only_succesful)},
+        )
+
+        model = Mountain if table == "mountains" else Expedition
+        leaderboard = []
+        for row in self.cursor.fetchall():
+            *columns, partition_key, metric_value, position = row
+            leaderboard.append(
+                (partition_key, position, metric_value, model(*columns))
+            )
+        return tuple(leaderboard)
+
+    def climber_graph(self) -> ClimberGraph:
+        """Builds the climber co-participation graph from the database."""
+        return ClimberGraph.build(self.cursor)
+
     def get_mountains_in_country(
         self, country: str, to_csv: bool = False
     ) -> tuple[Mountain, ...]:
         """Returns all mountains in the specified country. Optionally writes to CSV."""
-        self.cursor.execute(
-            "SELECT country, height, name, prominence, range, rank FROM mountains WHERE LOWER(country) = LOWER(?)",
-            (country,),
-        )
-        rows = self.cursor.fetchall()
-        mountains = tuple(
-            Mountain(row[5], row[2], row[0], row[1], row[3], row[4]) for row in rows
+        if self._has_schema(schema.ensure_mountain_countries):
+            # Includes border peaks whose first listed country is another one
+            self.cursor.execute(
+                "SELECT m.country, m.height, m.name, m.prominence, m.range, m.rank "
+                "FROM mountain_countries mc JOIN mountains m ON m.rank = mc.mountain_id "
+                "WHERE mc.country = ? ORDER BY m.rank",
+                (country,),
+            )
+        else:
+            self.cursor.execute(
+                "SELECT country, height, name, prominence, range, rank FROM mountains WHERE LOWER(country) = LOWER(?)",
+                (country,),
+            )
+        mountains = self._materialize(
+            lambda row: Mountain(row[5], row[2], row[0], row[1], row[3], row[4])
         )
 
         if to_csv:
             filename = f"Mountains in country {country}.csv"
-            with open(filename, "w", newline="", encoding="utf-8") as f:
-                writer = csv.writer(f)
-                writer.writerow(
-                    ["rank", "name", "country", "height", "prominence", "range"]
-                )
-                for m in mountains:
-                    writer.writerow(
-                        [
-                            m.rank,
-                            m.name,
-                            m.country,
-                            m.height,
-                            m.prominence,
-                            m.range,
-                        ]
-                    )
+            exporter.export_report(mountains, filename, model=Mountain)
 
         return mountains
 
@@ -278,48 +896,11 @@ class Reporter:
         self.cursor.execute(
             "SELECT * FROM climbers WHERE LOWER(nationality) = LOWER(?)", (country,)
         )
-        rows = self.cursor.fetchall()
-        climbers = tuple(
-            Climber(
-                id=row[0],
-                first_name=row[1],
-                last_name=row[2],
-                nationality=row[3],
-                date_of_birth=(
-                    datetime.strptime(row[4], "%Y-%m-%d").date()
-                    if isinstance(row[4], str)
-                    else row[4]
-                ),
-                expedition_id=row[5],
-            )
-            for row in rows
-        )
+        climbers = self._materialize(self._climber_from_row)
 
         if to_csv:
             filename = f"Climbers in country {country.capitalize()}.csv"
-            with open(filename, "w", newline="", encoding="utf-8") as f:
-                writer = csv.writer(f)
-                writer.writerow(
-                    [
-                        "id",
-                        "first_name",
-                        "last_name",
-                        "nationality",
-                        "date_of_birth",
-                        "expedition_id",
-                    ]
-                )
-                for c in climbers:
-                    writer.writerow(
-                        [
-                            c.id,
-                            c.first_name,
-                            c.last_name,
-                            c.nationality,
-                            c.date_of_birth.strftime("%Y-%m-%d"),
-                            c.expedition_id,
-                        ]
-                    )
+            exporter.export_report(climbers, filename, model=Climber)
 
         return climbers
 
@@ -59,12 +59,19 @@ class Expedition:
 
         return get_climbers_by_expedition_id(self.id)
 
-    def get_mountain(self) -> "Mountain":
+    def get_mountain(self, lazy: bool = False) -> "Mountain":
         """
         Returns the mountain object that this expedition targeted.
 
-        Uses a helper function from climbersapp to fetch data.
+        Uses a helper function from climbersapp to fetch data. With
+        lazy=True a reference is returned that only loads the mountain when
+        an attribute other than rank is read, see lazyreference.
         """
+        if lazy:
+            from lazyreference import MountainReference
+
+            return MountainReference(self.mountain_id)
+
         from climbersapp import get_mountain_by_rank
 
         return get_mountain_by_rank(self.mountain_id)
@@ -89,13 +96,28 @@ class Expedition:
         Args:
             to_format (str): Format string with placeholders (e.g. "%D days, %H hours, %M minutes")
 
+        Returns:
+            str: Formatted duration string.
+        """
+        return Expedition.format_duration(self.duration, to_format)
+
+    @staticmethod
+    def format_duration(duration: int, to_format: str) -> str:
+        """
+        Formats a duration in minutes like convert_duration does, for
+        durations that do not belong to one expedition (e.g. a median).
+
+        Args:
+            duration (int): Duration in minutes.
+            to_format (str): Format string with %D, %H and %M placeholders.
+
         Returns:
             str: Formatted duration string.
         """
         # Calculate days, hours, and minutes from total minutes
-        days = self.duration // (24 * 60)
-        hours = (self.duration % (24 * 60)) // 60
-        minutes = self.duration % 60
+        days = duration // (24 * 60)
+        hours = (duration % (24 * 60)) // 60
+        minutes = duration % 60
 
         # Replace placeholders with actual values
         result = to_format
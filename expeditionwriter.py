@@ -0,0 +1,218 @@
+import queue
+import sqlite3
+import threading
+import time
+
+import schema
+from sketches import ExpeditionSketches
+
+
+class RejectedRecordsError(ValueError):
+    """
+    Raised by ExpeditionWriter.flush() and stop() when records could not be
+    written. The other records of their batches were committed.
+
+    Attributes:
+        records (list[tuple[dict, Exception]]): Each rejected record with
+            the error it caused.
+    """
+
+    def __init__(self, records: list) -> None:
+        self.records = records
+        super().__init__(
+            f"{len(records)} record(s) rejected: "
+            + "; ".join(
+                f"{record.get('name') if isinstance(record, dict) else record!r}: {e!r}"
+                for record, e in records
+            )
+        )
+
+
+class ExpeditionWriter:
+    """
+    Background writer that appends expedition records while Reporter queries
+    keep running.
+
+    Records are put on a queue and written by a single thread on its own
+    connection. The database is switched to WAL mode, so readers never wait
+    for the writer, and records are committed in small batches bounded by
+    size and time. Every commit also logs the items it adds to the
+    approximate statistics and bumps the dataset version in the metadata
+    table, so readers can tell when new data is visible. A record that
+    cannot be written is rolled back on its own and reported by flush().
+
+    Attributes:
+        db_path (str): Path to the SQLite database.
+        max_batch_size (int): Most records committed in one transaction.
+        max_batch_delay (float): Most seconds a record waits before commit.
+        dataset_version (int): Version published by the last commit.
+    """
+
+    def __init__(
+        self,
+        db_path: str,
+        max_batch_size: int = 100,
+        max_batch_delay: float = 0.5,
+    ) -> None:
+        """
+        Initializes the writer. Call start() before submitting records.
+
+        Args:
+            db_path (str): Path to the SQLite database.
+            max_batch_size (int): Most records committed in one transaction.
+            max_batch_delay (float): Most seconds a record waits before commit.
+        """
+        self.db_path = db_path
+        self.max_batch_size = max_batch_size
+        self.max_batch_delay = max_batch_delay
+        self.dataset_version = 0
+        self._queue = queue.Queue()
+        self._thread = None
+        self._error = None
+        self._rejected = []
+        self._ready = threading.Event()
+
+    def start(self) -> None:
+        """Starts the writer thread and waits until it is ready to write."""
+        if self._thread is not None:
+            raise RuntimeError("ExpeditionWriter is already running.")
+        self._thread = threading.Thread(
+            target=self._run, name="ExpeditionWriter", daemon=True
+        )
+        self._thread.start()
+        self._ready.wait()
+        self._raise_error()
+
+    def submit(self, expedition: dict) -> None:
+        """
+        Queues one expedition record in the expeditions.json layout.
+
+        Args:
+            expedition (dict): The expedition, including mountain and climbers.
+        """
+        if self._thread is None:
+            raise RuntimeError("ExpeditionWriter is not running.")
+        self._raise_error()
+        self._queue.put(expedition)
+
+    def flush(self) -> int:
+        """
+        Waits until every queued record is committed and synced to disk.
+
+        Returns:
+            int: The dataset version that includes those records.
+
+        Raises:
+            RejectedRecordsError: If records could not be written; all
+                other records are committed.
+        """
+        self._queue.join()
+        self._raise_error()
+        self._raise_rejected()
+        return self.dataset_version
+
+    def stop(self) -> None:
+        """Commits the remaining records and stops the writer thread."""
+        if self._thread is None:
+            return
+        self._queue.put(None)
+        self._thread.join()
+        self._thread = None
+        self._raise_error()
+        self._raise_rejected()
+
+    def _raise_error(self) -> None:
+        """Re-raises an error from the writer thread in the caller."""
+        if self._error is not None:
+            error, self._error = self._error, None
+            raise error
+
+    def _raise_rejected(self) -> None:
+        """Raises RejectedRecordsError for records rejected since the last call."""
+        if self._rejected:
+            rejected, self._rejected = self._rejected, []
+            raise RejectedRecordsError(rejected)
+
+    def _write_batch(
+        self, connection, cursor, insert_expedition, records, seen_mountains, sketches
+    ) -> None:
+        """
+        Writes one batch in one transaction. Every record gets its own
+        savepoint, so a bad record is rolled back and reported on its own
+        while the rest of the batch is committed.
+        """
+        if not connection.in_transaction:
+            # Without an open transaction, releasing a savepoint would commit
+            cursor.execute("BEGIN")
+        rejected = []
+        for record in records:
+            cursor.execute("SAVEPOINT record")
+            try:
+                insert_expedition(cursor, record, seen_mountains, sketches)
+            except Exception as e:  # Any malformed record is rejected alone
+                cursor.execute("ROLLBACK TO record")
+                rejected.append((record, e))
+            cursor.execute("RELEASE record")
+        sketches.save(cursor)
+        version = schema.bump_dataset_version(cursor)
+        connection.commit()
+        self.dataset_version = version
+        self._rejected.extend(rejected)
+
+    def _run(self) -> None:
+        """Writer thread: collect a batch, write it, commit, repeat."""
+        try:
+            connection = sqlite3.connect(self.db_path)
+            cursor = connection.cursor()
+            cursor.execute("PRAGMA journal_mode=WAL")
+            # With NORMAL, WAL commits can be lost on power loss; FULL syncs
+            # every commit, so what flush() reports committed stays committed.
+            # Batching keeps the number of syncs low.
+            cursor.execute("PRAGMA synchronous=FULL")
+            # Readers only use the report schema, so the writer creates it
+            schema.ensure_report_schema(cursor)
+            schema.ensure_metadata_table(cursor)
+            ExpeditionSketches.ensure_stored(cursor)
+            connection.commit()
+            self.dataset_version = schema.get_dataset_version(cursor)
+        except sqlite3.Error as e:
+            self._error = e
+            self._ready.set()
+            return
+        self._ready.set()
+
+        from climbersapp import insert_expedition
+
+        # Mountains already written by this writer, see insert_expedition
+        seen_mountains = set()
+        running = True
+        while running:
+            batch = [self._queue.get()]
+            deadline = time.monotonic() + self.max_batch_delay
+            while len(batch) < self.max_batch_size and batch[-1] is not None:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+
+            if batch[-1] is None:
+                running = False
+            records = [record for record in batch if record is not None]
+            try:
+                if records:
+                    self._write_batch(
+                        connection, cursor, insert_expedition, records,
+                        seen_mountains, ExpeditionSketches(),
+                    )
+            except Exception as e:  # The thread must survive any failed batch
+                connection.rollback()
+                seen_mountains.clear()  # Their rows may have been rolled back
+                self._error = e
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+
+        connection.close()
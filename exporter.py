@@ -0,0 +1,277 @@
+import csv
+import gzip
+import io
+import itertools
+import json
+import struct
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime
+
+from climber import Climber
+from expedition import Expedition
+from mountain import Mountain
+
+# Column layout per model class, in the order the CSV reports always used
+COLUMNS = {
+    Climber: (
+        "id",
+        "first_name",
+        "last_name",
+        "nationality",
+        "date_of_birth",
+        "expedition_id",
+    ),
+    Mountain: ("rank", "name", "country", "height", "prominence", "range"),
+    Expedition: (
+        "id",
+        "name",
+        "mountain_id",
+        "start",
+        "date",
+        "country",
+        "duration",
+        "success",
+    ),
+}
+
+FORMATS = ("csv", "jsonl", "columnar")
+
+# Columnar file layout: a header, then one block per chunk of rows. Every
+# block holds the row count and then each column in turn, either as packed
+# 64-bit integers ("i") or as length-prefixed UTF-8 strings ("s", -1 = None).
+COLUMNAR_MAGIC = b"CLMC"
+COLUMNAR_VERSION = 1
+
+
+def _plain_value(value):
+    """Converts dates and booleans to the values written to every format."""
+    if isinstance(value, datetime):
+        return value.strftime("%Y-%m-%d")
+    if isinstance(value, date):
+        return value.strftime("%Y-%m-%d")
+    if isinstance(value, bool):
+        return int(value)
+    return value
+
+
+def to_rows(objects, model: type = None) -> tuple[tuple[str, ...], list[tuple]]:
+    """
+    Turns a Reporter result (a tuple of Climber, Mountain or Expedition
+    objects) into column names and plain rows.
+
+    Args:
+        objects (Iterable): Model objects, all of the same class.
+        model (type, optional): Model class, so empty results keep a header.
+
+    Returns:
+        tuple: The column names and an iterator of row tuples.
+    """
+    # Peek at the first object only, so spilled results keep streaming
+    objects = iter(objects)
+    if model is None:
+        first = next(objects, None)
+        if first is None:
+            return (), iter(())
+        model = first.__class__  # The model class, also for lazy references
+        objects = itertools.chain([first], objects)
+    columns = COLUMNS.get(model)
+    if columns is None:
+        raise TypeError(f"Cannot export objects of type {model.__name__}")
+    rows = (
+        tuple(_plain_value(getattr(obj, column)) for column in columns)
+        for obj in objects
+    )
+    return columns, rows
+
+
+def _chunks(rows, chunk_size):
+    """Yields lists of at most chunk_size rows from any iterable."""
+    chunk = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) == chunk_size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def _write_csv(f, columns, rows, chunk_size):
+    text = io.TextIOWrapper(f, encoding="utf-8", newline="")
+    writer = csv.writer(text)
+    writer.writerow(columns)
+    for chunk in _chunks(rows, chunk_size):
+        writer.writerows(chunk)
+    text.flush()
+    text.detach()
+
+
+def _write_jsonl(f, columns, rows, chunk_size):
+    for chunk in _chunks(rows, chunk_size):
+        lines = "".join(
+            json.dumps(dict(zip(columns, row)), ensure_ascii=False) + "\n"
+            for row in chunk
+        )
+        f.write(lines.encode("utf-8"))
+
+
+def _encode_column(values) -> bytes:
+    if all(isinstance(v, int) and not isinstance(v, bool) for v in values):
+        return b"i" + struct.pack(f"<{len(values)}q", *values)
+    parts = [b"s"]
+    for value in values:
+        if value is None:
+            parts.append(struct.pack("<i", -1))
+        else:
+            data = str(value).encode("utf-8")
+            parts.append(struct.pack("<i", len(data)))
+            parts.append(data)
+    return b"".join(parts)
+
+
+def _write_columnar(f, columns, rows, chunk_size):
+    f.write(COLUMNAR_MAGIC + struct.pack("<BH", COLUMNAR_VERSION, len(columns)))
+    for name in columns:
+        data = name.encode("utf-8")
+        f.write(struct.pack("<H", len(data)) + data)
+    for chunk in _chunks(rows, chunk_size):
+        block = [struct.pack("<I", len(chunk))]
+        for values in zip(*chunk):
+            block.append(_encode_column(values))
+        f.write(b"".join(block))
+
+
+WRITERS = {
+    "csv": _write_csv,
+    "jsonl": _write_jsonl,
+    "columnar": _write_columnar,
+}
+
+
+def export_rows(
+    path: str,
+    columns,
+    rows,
+    fmt: str = "csv",
+    compress: bool = False,
+    chunk_size: int = 1000,
+) -> str:
+    """
+    Writes rows to a file in the given format.
+
+    Args:
+        path (str): File to write. ".gz" is appended when compressing.
+        columns (Sequence[str]): Column names.
+        rows (Iterable[tuple]): Rows of plain values, can be a generator.
+        fmt (str): "csv", "jsonl" or "columnar".
+        compress (bool): Gzip the output.
+        chunk_size (int): Number of rows encoded and written at once.
+
+    Returns:
+        str: The path that was written.
+    """
+    if fmt not in WRITERS:
+        raise ValueError(f"fmt must be one of {', '.join(FORMATS)}")
+    if compress and not path.endswith(".gz"):
+        path += ".gz"
+    # A large buffer keeps the number of write calls low for big exports
+    opener = gzip.open(path, "wb", compresslevel=6) if compress else open(
+        path, "wb", buffering=1024 * 1024
+    )
+    with opener as f:
+        WRITERS[fmt](f, columns, rows, chunk_size)
+    return path
+
+
+def export_report(
+    objects,
+    path: str,
+    fmt: str = "csv",
+    compress: bool = False,
+    model: type = None,
+) -> str:
+    """
+    Writes a Reporter result (a tuple of model objects) to a file.
+
+    Args:
+        objects (Iterable): Climber, Mountain or Expedition objects.
+        path (str): File to write.
+        fmt (str): "csv", "jsonl" or "columnar".
+        compress (bool): Gzip the output.
+        model (type, optional): Model class, so empty results keep a header.
+
+    Returns:
+        str: The path that was written.
+    """
+    columns, rows = to_rows(objects, model)
+    return export_rows(path, columns, rows, fmt, compress)
+
+
+def export_reports(jobs, max_workers: int = 4) -> list[str]:
+    """
+    Writes several reports at the same time.
+
+    Args:
+        jobs (Iterable[dict]): Keyword arguments for export_report, one per
+            report, e.g. {"objects": climbers, "path": "a.csv"}.
+        max_workers (int): Number of reports written in parallel.
+
+    Returns:
+        list[str]: The written paths, in the order of the jobs.
+    """
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        futures = [pool.submit(export_report, **job) for job in jobs]
+        return [future.result() for future in futures]
+
+
+def read_columnar(path: str) -> tuple[tuple[str, ...], list[tuple]]:
+    """
+    Reads a file written in the columnar format, compressed or not.
+
+    Args:
+        path (str): File to read.
+
+    Returns:
+        tuple: The column names and a list of row tuples.
+    """
+    opener = gzip.open if path.endswith(".gz") else open
+    with opener(path, "rb") as f:
+        data = f.read()
+
+    if data[:4] != COLUMNAR_MAGIC:
+        raise ValueError(f"{path} is not a columnar export")
+    version, n_columns = struct.unpack_from("<BH", data, 4)
+    if version != COLUMNAR_VERSION:
+        raise ValueError(f"Unsupported columnar version {version}")
+    offset = 7
+    columns = []
+    for _ in range(n_columns):
+        (length,) = struct.unpack_from("<H", data, offset)
+        offset += 2
+        columns.append(data[offset:offset + length].decode("utf-8"))
+        offset += length
+
+    rows = []
+    while offset < len(data):
+        (n_rows,) = struct.unpack_from("<I", data, offset)
+        offset += 4
+        block = []
+        for _ in range(n_columns):
+            kind = data[offset:offset + 1]
+            offset += 1
+            if kind == b"i":
+                block.append(struct.unpack_from(f"<{n_rows}q", data, offset))
+                offset += 8 * n_rows
+                continue
+            values = []
+            for _ in range(n_rows):
+                (length,) = struct.unpack_from("<i", data, offset)
+                offset += 4
+                if length < 0:
+                    values.append(None)
+                else:
+                    values.append(data[offset:offset + length].decode("utf-8"))
+                    offset += length
+            block.append(values)
+        rows.extend(zip(*block))
+    return tuple(columns), rows
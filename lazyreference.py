@@ -0,0 +1,158 @@
+import copy
+import threading
+import weakref
+
+from climbersapp import get_expeditions_by_ids, get_mountains_by_ranks
+from expedition import Expedition
+from mountain import Mountain
+
+
+class LazyReference:
+    """
+    Stands in for a model object of which only the key is known.
+
+    Reading the key attribute costs nothing. Reading any other attribute
+    loads the row first, and every reference of the same kind that the
+    same thread created and has not loaded yet is loaded in the same IN
+    query, so walking many references costs one query instead of one per
+    object. References made by other threads are never loaded with it;
+    use resolve() to load an explicit group.
+
+    isinstance() sees the model class, so a reference can be used where
+    the full object is expected. Copying or pickling a reference loads it
+    and gives a copy of the full object.
+    """
+
+    __slots__ = ("_key_value", "_target", "__weakref__")
+
+    model = None  # The model class that is referenced
+    key = None  # Name of its key attribute
+    fetch = None  # Takes a list of keys, returns the model objects by key
+
+    def __init_subclass__(cls, **kwargs) -> None:
+        super().__init_subclass__(**kwargs)
+        cls._local = threading.local()
+
+    @classmethod
+    def _pending(cls) -> weakref.WeakSet:
+        """Returns this thread's unloaded references of this kind."""
+        pending = getattr(cls._local, "pending", None)
+        if pending is None:
+            pending = cls._local.pending = weakref.WeakSet()
+        return pending
+
+    def __init__(self, key_value) -> None:
+        """
+        Initializes an unloaded reference.
+
+        Args:
+            key_value: The key of the referenced row.
+        """
+        object.__setattr__(self, "_key_value", key_value)
+        object.__setattr__(self, "_target", None)
+        type(self)._pending().add(self)
+
+    @property
+    def __class__(self):
+        return self.model
+
+    def _resolve(self):
+        """Returns the referenced object, loading it with all pending ones."""
+        if self._target is None:
+            batch = list(type(self)._pending())
+            if self not in batch:
+                batch.append(self)
+            _load(batch)
+            if self._target is None:
+                raise LookupError(
+                    f"No {self.model.__name__} with {self.key} {self._key_value!r}"
+                )
+        return self._target
+
+    def __getattr__(self, name):
+        if name in ("_key_value", "_target"):
+            raise AttributeError(name)  # Unset slot, never load for it
+        if name == type(self).key:
+            return self._key_value
+        if name.startswith("__"):
+            raise AttributeError(name)  # Never load for protocol lookups
+        return getattr(self._resolve(), name)
+
+    def __setattr__(self, name, value) -> None:
+        setattr(self._resolve(), name, value)
+
+    def __copy__(self):
+        return copy.copy(self._resolve())
+
+    def __deepcopy__(self, memo):
+        return copy.deepcopy(self._resolve(), memo)
+
+    def __reduce__(self):
+        return self._resolve().__reduce_ex__(2)
+
+    def __repr__(self) -> str:
+        """Returns the object's repr once loaded, and the key before that."""
+        if self._target is not None:
+            return repr(self._target)
+        return f"<{self.model.__name__} {self.key}={self._key_value!r} (not loaded)>"
+
+
+class ExpeditionReference(LazyReference):
+    """Lazy reference to an Expedition, by id."""
+
+    __slots__ = ()
+    model = Expedition
+    key = "id"
+    fetch = staticmethod(get_expeditions_by_ids)
+
+
+class MountainReference(LazyReference):
+    """Lazy reference to a Mountain, by rank."""
+
+    __slots__ = ()
+    model = Mountain
+    key = "rank"
+    fetch = staticmethod(get_mountains_by_ranks)
+
+
+def is_loaded(reference) -> bool:
+    """Returns True if the object is not a LazyReference, or is loaded."""
+    return not isinstance(reference, LazyReference) or reference._target is not None
+
+
+def _load(references) -> list:
+    """Loads the unloaded references, returning the keys that were not found."""
+    by_kind = {}
+    for reference in references:
+        if not is_loaded(reference):
+            by_kind.setdefault(type(reference), []).append(reference)
+
+    missing = []
+    for kind, unloaded in by_kind.items():
+        found = kind.fetch(list({r._key_value for r in unloaded}))
+        pending = kind._pending()
+        for reference in unloaded:
+            target = found.get(reference._key_value)
+            if target is None:
+                missing.append(reference._key_value)
+            else:
+                object.__setattr__(reference, "_target", target)
+            # Missing ones leave the batch so they are not fetched again
+            pending.discard(reference)
+    return missing
+
+
+def resolve(references) -> None:
+    """
+    Loads the given references with one query per kind of reference.
+    Loaded references and other objects are skipped.
+
+    Args:
+        references (Iterable): LazyReference objects, kinds may be mixed.
+
+    Raises:
+        LookupError: If a referenced row does not exist.
+    """
+    missing = _load(references)
+    if missing:
+        raise LookupError(f"No rows found for keys {missing!r}")
@@ -0,0 +1,544 @@
+import asyncio
+import copy
+import json
+import os
+import random
+import sqlite3
+import sys
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from contextlib import nullcontext
+from datetime import datetime
+from fractions import Fraction
+
+import climbersapp
+import schema
+from climbersreporter import Reporter
+from mountain import Mountain
+from sketches import ExpeditionSketches
+
+MODES = ("thread", "process", "asyncio")
+
+# How the lazy getters reach the database within one process:
+#   "shared" keeps the single module cursor of climbersapp, as the app does,
+#   and serializes the calls on it (sharing it unguarded crashes sqlite3);
+#   "per_thread" gives every thread its own connection.
+LAZY_CONNECTIONS = ("shared", "per_thread")
+
+# Operations the harness can run, with their default share of the traffic.
+# The "lazy" ones go through the model getters, which use the shared module
+# cursor in climbersapp; "insert_expedition" writes on its own connection.
+DEFAULT_MIX = {
+    "get_climbers_from_country": 4,
+    "get_mountains_in_country": 4,
+    "get_climbers_that_climbed_mountain_between": 4,
+    "count_expeditions_between": 4,
+    "top_k": 2,
+    "lazy_expedition_climbers": 3,
+    "lazy_expedition_mountain": 3,
+    "lazy_climber_expedition": 3,
+    "insert_expedition": 1,
+}
+
+LOCKED = "database is locked"
+
+
+def _shift_years(value: str, years: int, fmt: str) -> str:
+    """Moves a date string by whole years, mapping 29 February to the 28th."""
+    day = datetime.strptime(value, fmt)
+    try:
+        return day.replace(year=day.year + years).strftime(fmt)
+    except ValueError:
+        return day.replace(year=day.year + years, day=28).strftime(fmt)
+
+
+def synthetic_record(template: dict, copy_number: int, rng: random.Random) -> dict:
+    """
+    Makes a new expedition record from one in expeditions.json, with its own
+    name, an earlier date and climbers born correspondingly earlier.
+
+    Args:
+        template (dict): A record in the expeditions.json layout.
+        copy_number (int): Used to make the names unique.
+        rng (random.Random): Source of the date shift.
+    """
+    record = copy.deepcopy(template)
+    years = -rng.randint(0, 30)
+    record.pop("id", None)
+    record["name"] = f"{record['name']} #{copy_number}"
+    record["date"] = _shift_years(record["date"], years, "%Y-%m-%d")
+    for climber in record["climbers"]:
+        climber["last_name"] = f"{climber['last_name']}-{copy_number}"
+        climber["date_of_birth"] = _shift_years(
+            climber["date_of_birth"], years, "%d-%m-%Y"
+        )
+    return record
+
+
+def build_synthetic_database(
+    path: str, scale: int = 100, seed: int = 0, json_path: str = None
+) -> int:
+    """
+    Creates a database at path with the tables of climbersapp.db, filled
+    with scale copies of every record in expeditions.json.
+
+    Args:
+        path (str): Where to create the database; must not exist yet.
+        scale (int): Number of copies of the dump to insert.
+        seed (int): Seed for the synthetic dates, for repeatable runs.
+        json_path (str, optional): Dump to copy, default climbersapp.json_path.
+
+    Returns:
+        int: The number of expeditions inserted.
+    """
+    if os.path.exists(path):
+        raise FileExistsError(path)
+    with open(json_path or climbersapp.json_path, "r", encoding="utf-8") as f:
+        templates = json.load(f)
+
+    connection = sqlite3.connect(path)
+    cursor = connection.cursor()
+    climbersapp.cursor.execute(
+        "SELECT sql FROM sqlite_master WHERE type = 'table' "
+        "AND name IN ('climbers', 'expeditions', 'mountains')"
+    )
+    for (sql,) in climbersapp.cursor.fetchall():
+        cursor.execute(sql)
+    schema.ensure_report_schema(cursor)
+    schema.ensure_metadata_table(cursor)
+
+    rng = random.Random(seed)
+    seen_mountains = set()
+    sketches = ExpeditionSketches()
+    for copy_number in range(scale):
+        for template in templates:
+            record = synthetic_record(template, copy_number, rng)
+            climbersapp.insert_expedition(cursor, record, seen_mountains, sketches)
+    sketches.save(cursor)
+    schema.bump_dataset_version(cursor)
+    connection.commit()
+    connection.close()
+    return scale * len(templates)
+
+
+def _parameters(db_path: str) -> dict:
+    """Collects the values the operations pick their arguments from."""
+    connection = sqlite3.connect(db_path)
+    cursor = connection.cursor()
+    cursor.execute("SELECT DISTINCT nationality FROM climbers")
+    nationalities = [row[0] for row in cursor.fetchall()]
+    cursor.execute("SELECT DISTINCT country FROM mountains")
+    countries = [row[0] for row in cursor.fetchall()]
+    cursor.execute("SELECT * FROM mountains")
+    mountains = [Mountain(*row) for row in cursor.fetchall()]
+    cursor.execute("SELECT MIN(id), MAX(id) FROM expeditions")
+    first_id, last_id = cursor.fetchone()
+    cursor.execute(
+        "SELECT MIN(substr(date, 1, 4)), MAX(substr(date, 1, 4)) FROM expeditions"
+    )
+    first_year, last_year = (int(year) for year in cursor.fetchone())
+    connection.close()
+    with open(climbersapp.json_path, "r", encoding="utf-8") as f:
+        templates = json.load(f)
+    return {
+        "nationalities": nationalities,
+        "countries": countries,
+        "mountains": mountains,
+        "expedition_ids": (first_id, last_id),
+        "years": (first_year, last_year),
+        "templates": templates,
+    }
+
+
+class _ThreadLocalCursor:
+    """Stands in for the climbersapp cursor, with one connection per thread."""
+
+    def __init__(self, db_path: str) -> None:
+        self.db_path = db_path
+        self.connections = []
+        self._local = threading.local()
+        self._lock = threading.Lock()
+
+    def __getattr__(self, name):
+        cursor = getattr(self._local, "cursor", None)
+        if cursor is None:
+            connection = sqlite3.connect(self.db_path, check_same_thread=False)
+            with self._lock:
+                self.connections.append(connection)
+            cursor = self._local.cursor = connection.cursor()
+        return getattr(cursor, name)
+
+    def close(self) -> None:
+        for connection in self.connections:
+            connection.close()
+
+
+# Held around every lazy getter call; a real lock for "shared"
+_lazy_lock = nullcontext()
+
+
+def _use_database(db_path: str, lazy_connection: str):
+    """
+    Points the climbersapp connection, which the lazy model getters use, at
+    db_path. Returns the object to close when the run is over.
+    """
+    global _lazy_lock
+    if lazy_connection == "shared":
+        connection = sqlite3.connect(db_path, check_same_thread=False)
+        climbersapp.connection = connection
+        climbersapp.cursor = connection.cursor()
+        _lazy_lock = threading.Lock()
+        return connection
+    cursor = _ThreadLocalCursor(db_path)
+    climbersapp.connection = None
+    climbersapp.cursor = cursor
+    _lazy_lock = nullcontext()
+    return cursor
+
+
+class _Session:
+    """One simulated client: its own Reporter, write connection and random picks."""
+
+    def __init__(
+        self, db_path: str, parameters: dict, seed: int, timeout: float
+    ) -> None:
+        self.db_path = db_path
+        self.parameters = parameters
+        self.timeout = timeout
+        self.rng = random.Random(seed)
+        self.reporter = Reporter()
+        # asyncio runs each call on whichever executor thread is free
+        self.reporter.initialize_database(db_path, check_same_thread=False)
+        self.writer = None
+        self.inserted = 0
+
+    def _expedition_id(self) -> int:
+        return self.rng.randint(*self.parameters["expedition_ids"])
+
+    def _period(self) -> tuple[datetime, datetime]:
+        year = self.rng.randint(*self.parameters["years"])
+        return datetime(year, 1, 1), datetime(year + 5, 12, 31)
+
+    def run(self, operation: str):
+        """Runs one operation and returns its result."""
+        rng, parameters, reporter = self.rng, self.parameters, self.reporter
+        if operation == "get_climbers_from_country":
+            return reporter.get_climbers_from_country(
+                rng.choice(parameters["nationalities"])
+            )
+        if operation == "get_mountains_in_country":
+            return reporter.get_mountains_in_country(rng.choice(parameters["countries"]))
+        if operation == "get_climbers_that_climbed_mountain_between":
+            return reporter.get_climbers_that_climbed_mountain_between(
+                rng.choice(parameters["mountains"]), *self._period()
+            )
+        if operation == "count_expeditions_between":
+            return reporter.count_expeditions_between(*self._period())
+        if operation == "top_k":
+            return reporter.top_k(rng.choice(("height", "duration", "climbers")))
+        if operation.startswith("lazy_"):
+            with _lazy_lock:
+                return self._run_lazy(operation)
+        if operation == "insert_expedition":
+            if self.writer is None:
+                self.writer = sqlite3.connect(
+                    self.db_path, timeout=self.timeout, check_same_thread=False
+                )
+            self.inserted += 1
+            record = synthetic_record(
+                rng.choice(parameters["templates"]), -self.inserted, rng
+            )
+            try:
+                climbersapp.insert_expedition(self.writer.cursor(), record)
+                self.writer.commit()
+            except sqlite3.Error:
+                self.writer.rollback()
+                raise
+            return None
+        raise ValueError(f"Unknown operation: {operation}")
+
+    def _run_lazy(self, operation: str):
+        if operation == "lazy_expedition_climbers":
+            expedition = climbersapp.get_expedition_by_id(self._expedition_id())
+            return expedition.get_climbers() if expedition else None
+        if operation == "lazy_expedition_mountain":
+            expedition = climbersapp.get_expedition_by_id(self._expedition_id())
+            return expedition.get_mountain() if expedition else None
+        if operation == "lazy_climber_expedition":
+            climbers = climbersapp.get_climbers_by_expedition_id(self._expedition_id())
+            return climbers[0].get_expedition() if climbers else None
+        raise ValueError(f"Unknown operation: {operation}")
+
+    def close(self) -> None:
+        self.reporter.connection.close()
+        if self.writer is not None:
+            self.writer.close()
+
+
+def _error_kind(error: Exception) -> str:
+    """Groups errors so that lock contention is counted on its own."""
+    if isinstance(error, sqlite3.OperationalError) and LOCKED in str(error):
+        return LOCKED
+    return f"{type(error).__name__}: {error}"
+
+
+def _pick(rng: random.Random, mix: dict) -> str:
+    return rng.choices(list(mix), weights=list(mix.values()))[0]
+
+
+def _timed(session: _Session, operation: str, samples: list, errors: Counter) -> None:
+    started = time.perf_counter()
+    try:
+        session.run(operation)
+    except Exception as e:  # Every failure is part of the measurement
+        errors[_error_kind(e)] += 1
+    samples.append((operation, time.perf_counter() - started))
+
+
+def _run_worker(
+    db_path: str,
+    parameters: dict,
+    mix: dict,
+    operations: int,
+    seed: int,
+    timeout: float,
+) -> tuple[list, Counter]:
+    """Runs one synchronous worker; used by the thread and process modes."""
+    samples, errors = [], Counter()
+    session = _Session(db_path, parameters, seed, timeout)
+    try:
+        for _ in range(operations):
+            _timed(session, _pick(session.rng, mix), samples, errors)
+    finally:
+        session.close()
+    return samples, errors
+
+
+def _init_process(db_path: str, lazy_connection: str) -> None:
+    _use_database(db_path, lazy_connection)
+
+
+async def _run_tasks(
+    db_path: str,
+    parameters: dict,
+    mix: dict,
+    workers: int,
+    operations: int,
+    seed: int,
+    timeout: float,
+) -> list[tuple[list, Counter]]:
+    """Runs the asyncio mode: every task awaits its calls on the default executor."""
+    executor = ThreadPoolExecutor(max_workers=workers)
+    loop = asyncio.get_running_loop()
+
+    async def task(number):
+        samples, errors = [], Counter()
+        session = _Session(db_path, parameters, seed + number, timeout)
+        try:
+            for _ in range(operations):
+                operation = _pick(session.rng, mix)
+                await loop.run_in_executor(
+                    executor, _timed, session, operation, samples, errors
+                )
+        finally:
+            session.close()
+        return samples, errors
+
+    try:
+        return await asyncio.gather(*(task(number) for number in range(workers)))
+    finally:
+        executor.shutdown()
+
+
+class LoadTestResult:
+    """
+    Outcome of a load test.
+
+    Attributes:
+        mode (str): "thread", "process" or "asyncio".
+        workers (int): Number of concurrent clients.
+        duration (float): Wall-clock seconds of the run.
+        lazy_connection (str): How the lazy getters reached the database.
+        latencies (dict[str, list[float]]): Seconds per call, per operation.
+        errors (Counter): Failed calls per kind of error.
+    """
+
+    def __init__(
+        self, mode: str, workers: int, duration: float, lazy_connection: str
+    ) -> None:
+        """
+        Initializes an empty LoadTestResult.
+
+        Args:
+            mode (str): "thread", "process" or "asyncio".
+            workers (int): Number of concurrent clients.
+            duration (float): Wall-clock seconds of the run.
+            lazy_connection (str): How the lazy getters reached the database.
+        """
+        self.mode = mode
+        self.workers = workers
+        self.duration = duration
+        self.lazy_connection = lazy_connection
+        self.latencies = {}
+        self.errors = Counter()
+
+    def add(self, samples: list, errors: Counter) -> None:
+        """Adds the (operation, seconds) samples and errors of one worker."""
+        for operation, seconds in samples:
+            self.latencies.setdefault(operation, []).append(seconds)
+        self.errors.update(errors)
+
+    @property
+    def calls(self) -> int:
+        """Total number of calls, failed ones included."""
+        return sum(len(values) for values in self.latencies.values())
+
+    @property
+    def throughput(self) -> float:
+        """Calls per second."""
+        return self.calls / self.duration if self.duration else 0.0
+
+    @property
+    def locked_errors(self) -> int:
+        """Number of calls that failed with "database is locked"."""
+        return self.errors[LOCKED]
+
+    def percentile(self, p: float, operation: str = None) -> float:
+        """
+        Returns a latency percentile in milliseconds (nearest rank).
+
+        Args:
+            p (float): The percentile, e.g. 95.
+            operation (str, optional): Only this operation, default all.
+        """
+        if operation is None:
+            values = [v for vs in self.latencies.values() for v in vs]
+        else:
+            values = list(self.latencies.get(operation, ()))
+        if not values:
+            return 0.0
+        values.sort()
+        rank = max(1, -(-Fraction(str(p)) * len(values) // 100))
+        return values[rank - 1] * 1000
+
+    def summary(self) -> dict:
+        """Returns the headline numbers, overall and per operation."""
+
+        def numbers(operation=None):
+            return {
+                "p50_ms": round(self.percentile(50, operation), 3),
+                "p95_ms": round(self.percentile(95, operation), 3),
+                "p99_ms": round(self.percentile(99, operation), 3),
+            }
+
+        return {
+            "mode": self.mode,
+            "workers": self.workers,
+            "lazy_connection": self.lazy_connection,
+            "calls": self.calls,
+            "seconds": round(self.duration, 3),
+            "calls_per_second": round(self.throughput, 1),
+            **numbers(),
+            "locked_errors": self.locked_errors,
+            "other_errors": sum(self.errors.values()) - self.locked_errors,
+            "operations": {
+                operation: {"calls": len(values), **numbers(operation)}
+                for operation, values in sorted(self.latencies.items())
+            },
+        }
+
+
+def run_load_test(
+    db_path: str,
+    workers: int = 8,
+    operations: int = 200,
+    mode: str = "thread",
+    mix: dict = None,
+    seed: int = 0,
+    timeout: float = 5.0,
+    lazy_connection: str = "shared",
+) -> LoadTestResult:
+    """
+    Drives a mix of Reporter calls, lazy model getters and inserts from
+    concurrent clients and measures them.
+
+    Args:
+        db_path (str): The database to test, e.g. from build_synthetic_database.
+        workers (int): Number of threads, processes or asyncio tasks.
+        operations (int): Calls made by each worker.
+        mode (str): "thread", "process" or "asyncio".
+        mix (dict, optional): Operation name to weight, default DEFAULT_MIX.
+        seed (int): Seed for the operation and argument picks.
+        timeout (float): Seconds a write waits for a lock before failing.
+        lazy_connection (str): "shared" or "per_thread", see LAZY_CONNECTIONS.
+
+    Returns:
+        LoadTestResult: Throughput, latencies and errors of the run.
+    """
+    if mode not in MODES:
+        raise ValueError("mode must be 'thread', 'process' or 'asyncio'")
+    if lazy_connection not in LAZY_CONNECTIONS:
+        raise ValueError("lazy_connection must be 'shared' or 'per_thread'")
+    mix = dict(DEFAULT_MIX if mix is None else mix)
+    unknown = set(mix) - set(DEFAULT_MIX)
+    if unknown:
+        raise ValueError(f"Unknown operations: {sorted(unknown)}")
+    parameters = _parameters(db_path)
+    args = (db_path, parameters, mix, operations)
+
+    original = climbersapp.connection, climbersapp.cursor
+    opened = None
+    started = time.perf_counter()
+    try:
+        if mode == "process":
+            with ProcessPoolExecutor(
+                max_workers=workers,
+                initializer=_init_process,
+                initargs=(db_path, lazy_connection),
+            ) as pool:
+                futures = [
+                    pool.submit(_run_worker, *args, seed + number, timeout)
+                    for number in range(workers)
+                ]
+                outcomes = [future.result() for future in futures]
+        else:
+            opened = _use_database(db_path, lazy_connection)
+            if mode == "thread":
+                with ThreadPoolExecutor(max_workers=workers) as pool:
+                    futures = [
+                        pool.submit(_run_worker, *args, seed + number, timeout)
+                        for number in range(workers)
+                    ]
+                    outcomes = [future.result() for future in futures]
+            else:
+                outcomes = asyncio.run(
+                    _run_tasks(*args[:3], workers, operations, seed, timeout)
+                )
+        duration = time.perf_counter() - started
+    finally:
+        if opened is not None:
+            opened.close()
+        climbersapp.connection, climbersapp.cursor = original
+
+    result = LoadTestResult(mode, workers, duration, lazy_connection)
+    for samples, errors in outcomes:
+        result.add(samples, errors)
+    return result
+
+
+if __name__ == "__main__":
+    db_path = os.path.join(sys.path[0], "loadtest.db")
+    if not os.path.exists(db_path):
+        print("Building", db_path)
+        build_synthetic_database(db_path)
+    for mode in MODES:
+        for lazy_connection in LAZY_CONNECTIONS:
+            for workers in (1, 4, 16):
+                result = run_load_test(
+                    db_path, workers, mode=mode, lazy_connection=lazy_connection
+                )
+                print(json.dumps(result.summary(), indent=4))
+                for kind, count in result.errors.most_common():
+                    print(f"  {count} x {kind}")
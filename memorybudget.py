@@ -0,0 +1,192 @@
+import pickle
+import sqlite3
+import sys
+import tempfile
+
+
+class MemoryBudget:
+    """
+    Limits how much of a query result is held in memory at once.
+
+    Attributes:
+        max_rows (int): Most rows kept in memory, or None for no limit.
+        max_bytes (int): Most estimated bytes kept in memory, or None.
+        batch_size (int): Rows fetched from SQLite per step.
+    """
+
+    def __init__(
+        self, max_rows: int = None, max_bytes: int = None, batch_size: int = 500
+    ) -> None:
+        """
+        Initializes a MemoryBudget.
+
+        Args:
+            max_rows (int, optional): Most rows kept in memory.
+            max_bytes (int, optional): Most estimated bytes kept in memory.
+            batch_size (int): Rows fetched from SQLite per step.
+        """
+        self.max_rows = max_rows
+        self.max_bytes = max_bytes
+        self.batch_size = batch_size
+
+    def __repr__(self) -> str:
+        """Returns a readable string representation of the budget."""
+        return (
+            f"MemoryBudget(batch_size={self.batch_size}, max_bytes={self.max_bytes}, "
+            f"max_rows={self.max_rows})"
+        )
+
+    def exceeded(self, rows: int, size: int) -> bool:
+        """Returns True if rows or size go over the budget."""
+        return (self.max_rows is not None and rows > self.max_rows) or (
+            self.max_bytes is not None and size > self.max_bytes
+        )
+
+
+class QueryStats:
+    """
+    Memory accounting for one materialized query result.
+
+    Attributes:
+        rows (int): Number of rows in the result.
+        peak_bytes (int): Most estimated bytes of rows and built objects
+            held in memory at once.
+        spilled (bool): Whether the result was moved to a temporary file.
+    """
+
+    def __init__(self, rows: int = 0, peak_bytes: int = 0, spilled: bool = False):
+        """Initializes QueryStats."""
+        self.rows = rows
+        self.peak_bytes = peak_bytes
+        self.spilled = spilled
+
+    def __repr__(self) -> str:
+        """Returns a readable string representation of the stats."""
+        return (
+            f"QueryStats(peak_bytes={self.peak_bytes}, rows={self.rows}, "
+            f"spilled={self.spilled})"
+        )
+
+
+class SpilledResult:
+    """
+    Query result stored in a temporary file instead of memory.
+
+    Iterating reads the rows back in batches and turns each one into a
+    model object, so only one batch is in memory at a time. It can be
+    iterated more than once, and len() works without reading the file.
+    """
+
+    def __init__(self, spill_file, count: int, build) -> None:
+        """
+        Initializes a SpilledResult.
+
+        Args:
+            spill_file (file): Temporary file holding pickled batches, each
+                a (built, items) pair of model objects or of raw rows.
+            count (int): Number of rows in the file.
+            build (Callable): Turns a row into a model object.
+        """
+        self._file = spill_file
+        self._count = count
+        self._build = build
+
+    def __repr__(self) -> str:
+        """Returns a readable string representation of the result."""
+        return f"SpilledResult(rows={self._count})"
+
+    def __len__(self) -> int:
+        """Returns the number of rows in the result."""
+        return self._count
+
+    def __iter__(self):
+        """Yields the model objects, reading the file batch by batch."""
+        self._file.seek(0)
+        while True:
+            try:
+                built, batch = pickle.load(self._file)
+            except EOFError:
+                return
+            if built:
+                yield from batch
+            else:
+                for row in batch:
+                    yield self._build(row)
+
+    def close(self) -> None:
+        """Deletes the temporary file."""
+        self._file.close()
+
+
+def row_size(row: tuple) -> int:
+    """Estimates the bytes a fetched row takes in memory."""
+    return sys.getsizeof(row) + sum(sys.getsizeof(value) for value in row)
+
+
+def object_size(obj) -> int:
+    """Estimates the bytes a model object takes in memory, with its __dict__."""
+    fields = getattr(obj, "__dict__", None)
+    if fields is None:
+        return row_size(obj) if isinstance(obj, tuple) else sys.getsizeof(obj)
+    return (
+        sys.getsizeof(obj)
+        + sys.getsizeof(fields)
+        + sum(sys.getsizeof(value) for value in fields.values())
+    )
+
+
+def materialize(
+    cursor: sqlite3.Cursor, build, budget: MemoryBudget = None
+) -> tuple[object, QueryStats]:
+    """
+    Fetches the rows of an executed query and turns them into model objects.
+
+    Rows are turned into objects batch by batch, and the budget counts the
+    objects built so far plus the rows of the batch being built. Without a
+    budget, or while the result fits in it, this returns a tuple. Once the
+    budget is exceeded, the objects built so far and the remaining rows are
+    written to a temporary file and a SpilledResult is returned instead.
+
+    Args:
+        cursor (sqlite3.Cursor): Cursor with an executed query.
+        build (Callable): Turns a row into a model object.
+        budget (MemoryBudget, optional): Limits for the result.
+
+    Returns:
+        tuple: The result and the QueryStats for it.
+    """
+    batch_size = budget.batch_size if budget is not None else 500
+    stats = QueryStats()
+    objects = []
+    size = 0
+    spill_file = None
+
+    while True:
+        batch = cursor.fetchmany(batch_size)
+        if not batch:
+            break
+        batch_bytes = sum(row_size(row) for row in batch)
+        stats.rows += len(batch)
+
+        if spill_file is not None:
+            stats.peak_bytes = max(stats.peak_bytes, batch_bytes)
+            pickle.dump((False, batch), spill_file, pickle.HIGHEST_PROTOCOL)
+            continue
+
+        built = [build(row) for row in batch]
+        size += sum(object_size(obj) for obj in built)
+        objects.extend(built)
+        # The rows of this batch are still alive next to their objects
+        stats.peak_bytes = max(stats.peak_bytes, size + batch_bytes)
+        del built, batch
+        if budget is not None and budget.exceeded(len(objects), size):
+            spill_file = tempfile.TemporaryFile()
+            pickle.dump((True, objects), spill_file, pickle.HIGHEST_PROTOCOL)
+            objects = []
+            size = 0
+
+    if spill_file is not None:
+        spill_file.flush()
+        stats.spilled = True
+        return SpilledResult(spill_file, stats.rows, build), stats
+    return tuple(objects), stats
@@ -0,0 +1,398 @@
+import sqlite3
+
+# The base tables (climbers, expeditions, mountains) ship with climbersapp.db.
+# This module only adds the indexes and derived tables used by the reports,
+# so it is safe to run against an existing database more than once.
+
+
+# Tables and indexes created by each ensure_* helper the reports use, so
+# that readers can check for them without writing to the database
+SCHEMA_OBJECTS = {
+    "ensure_time_index": (
+        "idx_expeditions_mountain_date",
+        "idx_expeditions_date",
+        "idx_climbers_expedition_id",
+        "expedition_buckets",
+    ),
+    "ensure_leaderboard_indexes": (
+        "idx_mountains_height",
+        "idx_expeditions_duration",
+        "idx_expeditions_mountain_date",
+        "idx_climbers_expedition_id",
+    ),
+    "ensure_mountain_countries": (
+        "mountain_countries",
+        "idx_mountain_countries_mountain_id",
+    ),
+    "ensure_duration_summary": ("idx_expeditions_duration", "duration_counts"),
+}
+
+
+def has_schema(cursor: sqlite3.Cursor, setup) -> bool:
+    """
+    Checks, without writing, whether everything an ensure_* helper creates
+    already exists.
+
+    Args:
+        cursor (sqlite3.Cursor): Cursor on the database.
+        setup: One of the ensure_* helpers listed in SCHEMA_OBJECTS.
+    """
+    names = SCHEMA_OBJECTS[setup.__name__]
+    cursor.execute(
+        f"SELECT COUNT(*) FROM sqlite_master WHERE name IN ({', '.join('?' * len(names))})",
+        names,
+    )
+    return cursor.fetchone()[0] == len(names)
+
+
+def ensure_time_index(cursor: sqlite3.Cursor) -> None:
+    """
+    Creates the indexes and the year/month rollup table used by the
+    time-range reports.
+
+    Args:
+        cursor (sqlite3.Cursor): Cursor on a writable database.
+    """
+    cursor.execute(
+        "CREATE INDEX IF NOT EXISTS idx_expeditions_mountain_date "
+        "ON expeditions (mountain_id, date)"
+    )
+    cursor.execute(
+        "CREATE INDEX IF NOT EXISTS idx_expeditions_date ON expeditions (date)"
+    )
+    cursor.execute(
+        "CREATE INDEX IF NOT EXISTS idx_climbers_expedition_id "
+        "ON climbers (expedition_id)"
+    )
+    cursor.execute(
+        """
+        CREATE TABLE IF NOT EXISTS expedition_buckets (
+            year INTEGER NOT NULL,
+            month INTEGER NOT NULL,
+            mountain_id INTEGER NOT NULL,
+            expeditions INTEGER NOT NULL,
+            successes INTEGER NOT NULL,
+            climbers INTEGER NOT NULL,
+            PRIMARY KEY (year, month, mountain_id)
+        ) WITHOUT ROWID
+        """
+    )
+
+    # A freshly created rollup on an existing dataset starts out empty
+    cursor.execute("SELECT 1 FROM expedition_buckets LIMIT 1")
+    if cursor.fetchone() is None:
+        refresh_expedition_buckets(cursor)
+
+
+def ensure_leaderboard_indexes(cursor: sqlite3.Cursor) -> None:
+    """
+    Creates the indexes used by the top-K leaderboard queries.
+
+    Args:
+        cursor (sqlite3.Cursor): Cursor on a writable database.
+    """
+    cursor.execute(
+        "CREATE INDEX IF NOT EXISTS idx_mountains_height ON mountains (height)"
+    )
+    cursor.execute(
+        "CREATE INDEX IF NOT EXISTS idx_expeditions_duration "
+        "ON expeditions (duration)"
+    )
+    cursor.execute(
+        "CREATE INDEX IF NOT EXISTS idx_expeditions_mountain_date "
+        "ON expeditions (mountain_id, date)"
+    )
+    cursor.execute(
+        "CREATE INDEX IF NOT EXISTS idx_climbers_expedition_id "
+        "ON climbers (expedition_id)"
+    )
+
+
+def ensure_mountain_countries(cursor: sqlite3.Cursor) -> None:
+    """
+    Creates the link table holding every country a mountain lies in.
+    mountains.country only keeps the first one, which loses border peaks.
+    An empty link table is filled from mountains.country, so older
+    databases keep at least their first country.
+
+    Args:
+        cursor (sqlite3.Cursor): Cursor on a writable database.
+    """
+    cursor.execute(
+        """
+        CREATE TABLE IF NOT EXISTS mountain_countries (
+            country TEXT NOT NULL COLLATE NOCASE,
+            mountain_id INTEGER NOT NULL,
+            PRIMARY KEY (country, mountain_id)
+        ) WITHOUT ROWID
+        """
+    )
+    cursor.execute(
+        "CREATE INDEX IF NOT EXISTS idx_mountain_countries_mountain_id "
+        "ON mountain_countries (mountain_id)"
+    )
+    cursor.execute("SELECT 1 FROM mountain_countries LIMIT 1")
+    if cursor.fetchone() is None:
+        cursor.execute(
+            "INSERT OR IGNORE INTO mountain_countries (country, mountain_id) "
+            "SELECT country, rank FROM mountains"
+        )
+
+
+def ensure_duration_summary(cursor: sqlite3.Cursor) -> None:
+    """
+    Creates the duration index and the duration_counts table, which holds
+    how many expeditions per mountain and success status took each
+    duration. Duration statistics read it in key order instead of sorting
+    the expeditions.
+
+    Args:
+        cursor (sqlite3.Cursor): Cursor on a writable database.
+    """
+    cursor.execute(
+        "CREATE INDEX IF NOT EXISTS idx_expeditions_duration "
+        "ON expeditions (duration)"
+    )
+    cursor.execute(
+        """
+        CREATE TABLE IF NOT EXISTS duration_counts (
+            mountain_id INTEGER NOT NULL,
+            success INTEGER NOT NULL,
+            duration INTEGER NOT NULL,
+            expeditions INTEGER NOT NULL,
+            PRIMARY KEY (mountain_id, success, duration)
+        ) WITHOUT ROWID
+        """
+    )
+
+    # A freshly created summary on an existing dataset starts out empty
+    cursor.execute("SELECT 1 FROM duration_counts LIMIT 1")
+    if cursor.fetchone() is None:
+        refresh_duration_counts(cursor)
+
+
+def ensure_report_schema(cursor: sqlite3.Cursor) -> None:
+    """
+    Runs every ensure_* helper the reports use.
+
+    Args:
+        cursor (sqlite3.Cursor): Cursor on a writable database.
+    """
+    ensure_time_index(cursor)
+    ensure_leaderboard_indexes(cursor)
+    ensure_mountain_countries(cursor)
+    ensure_duration_summary(cursor)
+
+
+def refresh_expedition_buckets(cursor: sqlite3.Cursor) -> None:
+    """
+    Rebuilds the year/month rollup table from the expeditions table.
+
+    Args:
+        cursor (sqlite3.Cursor): Cursor on a writable database.
+    """
+    cursor.execute("DELETE FROM expedition_buckets")
+    cursor.execute(
+        """
+        INSERT INTO expedition_buckets
+            (year, month, mountain_id, expeditions, successes, climbers)
+        SELECT year, month, mountain_id, COUNT(*), SUM(success), SUM(climbers)
+        FROM (
+            SELECT
+                CAST(substr(e.date, 1, 4) AS INTEGER) AS year,
+                CAST(substr(e.date, 6, 2) AS INTEGER) AS month,
+                e.mountain_id,
+                e.success,
+                (SELECT COUNT(*) FROM climbers c WHERE c.expedition_id = e.id)
+                    AS climbers
+            FROM expeditions e
+        )
+        GROUP BY year, month, mountain_id
+        """
+    )
+
+
+def add_to_expedition_bucket(
+    cursor: sqlite3.Cursor,
+    mountain_id: int,
+    date: str,
+    success: int,
+    climbers: int,
+) -> None:
+    """
+    Adds a single expedition to its year/month bucket.
+
+    Args:
+        cursor (sqlite3.Cursor): Cursor on a writable database.
+        mountain_id (int): Rank of the mountain that was climbed.
+        date (str): Expedition date as "YYYY-MM-DD".
+        success (int): 1 if the expedition was successful, otherwise 0.
+        climbers (int): Number of climbers on the expedition.
+    """
+    cursor.execute(
+        """
+        INSERT INTO expedition_buckets
+            (year, month, mountain_id, expeditions, successes, climbers)
+        VALUES (?, ?, ?, 1, ?, ?)
+        ON CONFLICT (year, month, mountain_id) DO UPDATE SET
+            expeditions = expeditions + 1,
+            successes = successes + excluded.successes,
+            climbers = climbers + excluded.climbers
+        """,
+        (int(date[:4]), int(date[5:7]), mountain_id, success, climbers),
+    )
+
+
+def refresh_duration_counts(cursor: sqlite3.Cursor) -> None:
+    """
+    Rebuilds the duration_counts table from the expeditions table.
+
+    Args:
+        cursor (sqlite3.Cursor): Cursor on a writable database.
+    """
+    cursor.execute("DELETE FROM duration_counts")
+    cursor.execute(
+        """
+        INSERT INTO duration_counts (mountain_id, success, duration, expeditions)
+        SELECT mountain_id, success, duration, COUNT(*) FROM expeditions
+        GROUP BY mountain_id, success, duration
+        """
+    )
+
+
+def add_to_duration_count(
+    cursor: sqlite3.Cursor, mountain_id: int, success: int, duration: int
+) -> None:
+    """
+    Counts a single expedition in the duration_counts table.
+
+    Args:
+        cursor (sqlite3.Cursor): Cursor on a writable database.
+        mountain_id (int): Rank of the mountain that was climbed.
+        success (int): 1 if the expedition was successful, otherwise 0.
+        duration (int): Duration of the expedition in minutes.
+    """
+    cursor.execute(
+        """
+        INSERT INTO duration_counts (mountain_id, success, duration, expeditions)
+        VALUES (?, ?, ?, 1)
+        ON CONFLICT (mountain_id, success, duration) DO UPDATE SET
+            expeditions = expeditions + 1
+        """,
+        (mountain_id, success, duration),
+    )
+
+
+def ensure_sketch_table(cursor: sqlite3.Cursor) -> None:
+    """
+    Creates the tables the approximate statistics (see sketches.py) are
+    stored in: one serialized sketch per row, and a log of the items added
+    by commits since the sketches were last brought up to date.
+
+    Args:
+        cursor (sqlite3.Cursor): Cursor on a writable database.
+    """
+    cursor.execute(
+        """
+        CREATE TABLE IF NOT EXISTS sketches (
+            name TEXT PRIMARY KEY,
+            data BLOB NOT NULL
+        )
+        """
+    )
+    cursor.execute(
+        """
+        CREATE TABLE IF NOT EXISTS sketch_log (
+            id INTEGER PRIMARY KEY,
+            items TEXT NOT NULL
+        )
+        """
+    )
+
+
+def ensure_metadata_table(cursor: sqlite3.Cursor) -> None:
+    """
+    Creates the key/value metadata table that holds the dataset version.
+
+    Args:
+        cursor (sqlite3.Cursor): Cursor on a writable database.
+    """
+    cursor.execute(
+        """
+        CREATE TABLE IF NOT EXISTS metadata (
+            key TEXT PRIMARY KEY,
+            value TEXT NOT NULL
+        )
+        """
+    )
+
+
+def get_metadata(cursor: sqlite3.Cursor, key: str) -> str:
+    """
+    Returns a value from the metadata table.
+
+    Args:
+        cursor (sqlite3.Cursor): Cursor on the database.
+        key (str): The metadata key.
+
+    Returns:
+        str: The stored value, or None if the key or the table is missing.
+    """
+    try:
+        cursor.execute("SELECT value FROM metadata WHERE key = ?", (key,))
+    except sqlite3.OperationalError:
+        return None  # No metadata table yet
+    row = cursor.fetchone()
+    return row[0] if row else None
+
+
+def set_metadata(cursor: sqlite3.Cursor, key: str, value: str) -> None:
+    """
+    Stores a value in the metadata table. Does not commit.
+
+    Args:
+        cursor (sqlite3.Cursor): Cursor on a writable database.
+        key (str): The metadata key.
+        value (str): The value to store.
+    """
+    cursor.execute(
+        "INSERT OR REPLACE INTO metadata (key, value) VALUES (?, ?)", (key, value)
+    )
+
+
+def delete_metadata(cursor: sqlite3.Cursor, key: str) -> None:
+    """
+    Removes a value from the metadata table. Does not commit.
+
+    Args:
+        cursor (sqlite3.Cursor): Cursor on a writable database.
+        key (str): The metadata key.
+    """
+    cursor.execute("DELETE FROM metadata WHERE key = ?", (key,))
+
+
+def get_dataset_version(cursor: sqlite3.Cursor) -> int:
+    """
+    Returns the dataset version, or 0 if it was never published.
+
+    Args:
+        cursor (sqlite3.Cursor): Cursor on the database.
+    """
+    version = get_metadata(cursor, "dataset_version")
+    return int(version) if version is not None else 0
+
+
+def bump_dataset_version(cursor: sqlite3.Cursor) -> int:
+    """
+    Increments the dataset version inside the current transaction so it is
+    published together with the data that was written.
+
+    Args:
+        cursor (sqlite3.Cursor): Cursor on a writable database.
+
+    Returns:
+        int: The new dataset version.
+    """
+    version = get_dataset_version(cursor) + 1
+    set_metadata(cursor, "dataset_version", str(version))
+    return version
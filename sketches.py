@@ -0,0 +1,331 @@
+import hashlib
+import json
+import math
+import random
+import sqlite3
+import struct
+from array import array
+
+import schema
+
+
+def _hash64(value: str) -> int:
+    """Returns a stable 64-bit hash of a string."""
+    return int.from_bytes(
+        hashlib.blake2b(value.encode("utf-8"), digest_size=8).digest(), "little"
+    )
+
+
+class HyperLogLog:
+    """
+    Estimates the number of distinct items in a stream using a fixed
+    amount of memory. With the default precision of 14 it uses 16 KB and
+    the typical error is about 0.8%.
+    """
+
+    def __init__(self, precision: int = 14) -> None:
+        """
+        Initializes an empty HyperLogLog.
+
+        Args:
+            precision (int): Number of index bits; 2**precision registers.
+        """
+        self.precision = precision
+        self.registers = bytearray(1 << precision)
+
+    def add(self, value: str) -> None:
+        """Adds one item."""
+        h = _hash64(value)
+        index = h >> (64 - self.precision)
+        rest = h & ((1 << (64 - self.precision)) - 1)
+        rank = (64 - self.precision) - rest.bit_length() + 1
+        if rank > self.registers[index]:
+            self.registers[index] = rank
+
+    def count(self) -> int:
+        """Returns the estimated number of distinct items."""
+        m = len(self.registers)
+        alpha = 0.7213 / (1 + 1.079 / m)
+        estimate = alpha * m * m / sum(2.0 ** -r for r in self.registers)
+        zeros = self.registers.count(0)
+        if estimate <= 2.5 * m and zeros:
+            estimate = m * math.log(m / zeros)  # Linear counting for small sets
+        return round(estimate)
+
+    def to_bytes(self) -> bytes:
+        """Serializes the sketch."""
+        return struct.pack("<B", self.precision) + bytes(self.registers)
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> "HyperLogLog":
+        """Restores a sketch made by to_bytes."""
+        sketch = cls(data[0])
+        sketch.registers = bytearray(data[1:])
+        return sketch
+
+
+class CountMinSketch:
+    """
+    Estimates how often each key occurs in a stream using a fixed amount of
+    memory. Estimates are never too low, and too high by at most a small
+    fraction of the total count. Keys are compared case-insensitively, like
+    the nationality and country lookups in Reporter.
+    """
+
+    def __init__(self, width: int = 2048, depth: int = 4) -> None:
+        """
+        Initializes an empty CountMinSketch.
+
+        Args:
+            width (int): Counters per row.
+            depth (int): Number of rows, each with its own hash.
+        """
+        self.width = width
+        self.depth = depth
+        self.total = 0
+        self.counts = array("Q", bytes(8 * width * depth))
+
+    def _cells(self, key: str):
+        h = _hash64(key.lower())
+        h1, h2 = h & 0xFFFFFFFF, (h >> 32) | 1
+        for row in range(self.depth):
+            yield row * self.width + (h1 + row * h2) % self.width
+
+    def add(self, key: str, count: int = 1) -> None:
+        """Adds count occurrences of key."""
+        self.total += count
+        for cell in self._cells(key):
+            self.counts[cell] += count
+
+    def estimate(self, key: str) -> int:
+        """Returns the estimated number of occurrences of key."""
+        return min(self.counts[cell] for cell in self._cells(key))
+
+    def to_bytes(self) -> bytes:
+        """Serializes the sketch."""
+        return struct.pack("<IIQ", self.width, self.depth, self.total) + (
+            self.counts.tobytes()
+        )
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> "CountMinSketch":
+        """Restores a sketch made by to_bytes."""
+        width, depth, total = struct.unpack_from("<IIQ", data)
+        sketch = cls(width, depth)
+        sketch.total = total
+        sketch.counts = array("Q")
+        sketch.counts.frombytes(data[16:])
+        return sketch
+
+
+class Reservoir:
+    """
+    Keeps a uniform random sample of fixed size from a stream of integers,
+    using Algorithm R.
+    """
+
+    def __init__(self, size: int = 100) -> None:
+        """
+        Initializes an empty Reservoir.
+
+        Args:
+            size (int): Number of items kept.
+        """
+        self.size = size
+        self.seen = 0
+        self.items = []
+        self._random = random.Random()
+
+    def add(self, item: int) -> None:
+        """Offers one item to the sample."""
+        self.seen += 1
+        if len(self.items) < self.size:
+            self.items.append(item)
+            return
+        slot = self._random.randrange(self.seen)
+        if slot < self.size:
+            self.items[slot] = item
+
+    def to_bytes(self) -> bytes:
+        """Serializes the sample."""
+        return struct.pack(
+            f"<IQ{len(self.items)}q", self.size, self.seen, *self.items
+        )
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> "Reservoir":
+        """Restores a sample made by to_bytes."""
+        size, seen = struct.unpack_from("<IQ", data)
+        sample = cls(size)
+        sample.seen = seen
+        sample.items = list(struct.unpack_from(f"<{(len(data) - 12) // 8}q", data, 12))
+        return sample
+
+
+def identity_key(first_name, last_name, nationality, date_of_birth) -> str:
+    """Returns the key that identifies a climber, as in Climber.is_same_climber."""
+    return f"{first_name}\x1f{last_name}\x1f{nationality}\x1f{date_of_birth}"
+
+
+class ExpeditionSketches:
+    """
+    Approximate statistics over the whole dataset, kept up to date by ingest
+    and stored in the sketches table next to the data.
+
+    Writers do not store their own copy of the sketches. Each commit saves
+    only the items it added to the sketch_log table, and the log is
+    regularly replayed into the stored sketches, so writers running side by
+    side never overwrite each other's updates.
+
+    Attributes:
+        climbers (HyperLogLog): Distinct climber identities.
+        nationalities (CountMinSketch): Climbers per nationality.
+        countries (CountMinSketch): Expeditions per country.
+        expeditions (Reservoir): Random sample of expedition ids.
+    """
+
+    # Logged commits after which save() replays the log into the sketches
+    COMPACT_AFTER = 100
+
+    def __init__(self) -> None:
+        """Initializes empty sketches."""
+        self.climbers = HyperLogLog()
+        self.nationalities = CountMinSketch()
+        self.countries = CountMinSketch()
+        self.expeditions = Reservoir()
+        self._unsaved = {"expeditions": [], "climbers": []}
+
+    def add_expedition(self, expedition_id: int, country: str) -> None:
+        """Adds one expedition."""
+        self.countries.add(country)
+        self.expeditions.add(expedition_id)
+        self._unsaved["expeditions"].append((expedition_id, country))
+
+    def add_climber(self, first_name, last_name, nationality, date_of_birth) -> None:
+        """Adds one climber row; date_of_birth as "YYYY-MM-DD"."""
+        self.climbers.add(
+            identity_key(first_name, last_name, nationality, date_of_birth)
+        )
+        self.nationalities.add(nationality)
+        self._unsaved["climbers"].append(
+            (first_name, last_name, nationality, date_of_birth)
+        )
+
+    def _replay(self, items: dict) -> None:
+        """Adds the items of one sketch log row."""
+        for expedition_id, country in items["expeditions"]:
+            self.add_expedition(expedition_id, country)
+        for climber in items["climbers"]:
+            self.add_climber(*climber)
+
+    @classmethod
+    def build(cls, cursor: sqlite3.Cursor) -> "ExpeditionSketches":
+        """
+        Builds the sketches from scratch with one scan of each table.
+
+        Args:
+            cursor (sqlite3.Cursor): Cursor on the database.
+        """
+        sketches = cls()
+        cursor.execute("SELECT id, country FROM expeditions ORDER BY id")
+        for expedition_id, country in cursor.fetchall():
+            sketches.add_expedition(expedition_id, country)
+        cursor.execute(
+            "SELECT first_name, last_name, nationality, date_of_birth FROM climbers"
+        )
+        for row in cursor:
+            sketches.add_climber(*row)
+        sketches._unsaved = {"expeditions": [], "climbers": []}  # Already stored
+        return sketches
+
+    def save(self, cursor: sqlite3.Cursor) -> None:
+        """
+        Stores the items added since the last save in the sketch log, in the
+        current transaction. Does not commit.
+
+        A commit only writes its own items, not the whole sketches. Once
+        COMPACT_AFTER commits are logged, the log is replayed into the
+        stored sketches, read in this transaction, and cleared.
+
+        Args:
+            cursor (sqlite3.Cursor): Cursor on a writable database.
+        """
+        if not any(self._unsaved.values()):
+            return
+        schema.ensure_sketch_table(cursor)
+        cursor.execute(
+            "INSERT INTO sketch_log (items) VALUES (?)", (json.dumps(self._unsaved),)
+        )
+        self._unsaved = {"expeditions": [], "climbers": []}
+        cursor.execute("SELECT COUNT(*) FROM sketch_log")
+        if cursor.fetchone()[0] >= self.COMPACT_AFTER:
+            stored = self.load(cursor)
+            (stored or self.build(cursor))._store(cursor)
+
+    def _store(self, cursor: sqlite3.Cursor) -> None:
+        """Stores these sketches in full and clears the log they include."""
+        schema.ensure_sketch_table(cursor)
+        cursor.executemany(
+            "INSERT OR REPLACE INTO sketches (name, data) VALUES (?, ?)",
+            [
+                ("climbers", self.climbers.to_bytes()),
+                ("nationalities", self.nationalities.to_bytes()),
+                ("countries", self.countries.to_bytes()),
+                ("expeditions", self.expeditions.to_bytes()),
+            ],
+        )
+        cursor.execute("DELETE FROM sketch_log")
+
+    @classmethod
+    def ensure_stored(cls, cursor: sqlite3.Cursor) -> None:
+        """
+        Builds and stores the sketches if none are stored yet. Does not
+        commit.
+
+        Args:
+            cursor (sqlite3.Cursor): Cursor on a writable database.
+        """
+        if not cursor.connection.in_transaction:
+            # Hold the write lock, so no commit lands between build and store
+            cursor.execute("BEGIN IMMEDIATE")
+        if cls.load(cursor) is None:
+            cls.build(cursor)._store(cursor)
+
+    @classmethod
+    def load(cls, cursor: sqlite3.Cursor) -> "ExpeditionSketches":
+        """
+        Loads stored sketches, including the items in the sketch log.
+
+        Args:
+            cursor (sqlite3.Cursor): Cursor on the database.
+
+        Returns:
+            ExpeditionSketches: The sketches, or None if none were stored.
+        """
+        try:
+            cursor.execute("SELECT name, data FROM sketches")
+        except sqlite3.OperationalError:
+            return None  # No sketches table yet
+        stored = dict(cursor.fetchall())
+        if len(stored) < 4:
+            return None
+        sketches = cls()
+        sketches.climbers = HyperLogLog.from_bytes(stored["climbers"])
+        sketches.nationalities = CountMinSketch.from_bytes(stored["nationalities"])
+        sketches.countries = CountMinSketch.from_bytes(stored["countries"])
+        sketches.expeditions = Reservoir.from_bytes(stored["expeditions"])
+        try:
+            cursor.execute("SELECT items FROM sketch_log ORDER BY id")
+            log = cursor.fetchall()
+        except sqlite3.OperationalError:
+            log = []  # Stored before the sketch log existed
+        for (items,) in log:
+            sketches._replay(json.loads(items))
+        sketches._unsaved = {"expeditions": [], "climbers": []}
+        return sketches
+
+    @classmethod
+    def load_or_build(cls, cursor: sqlite3.Cursor) -> "ExpeditionSketches":
+        """Loads stored sketches, or builds them when none are stored."""
+        sketches = cls.load(cursor)
+        return sketches if sketches is not None else cls.build(cursor)
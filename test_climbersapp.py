@@ -1,9 +1,28 @@
+import copy
+import gzip
+import json
+import os
+import pickle
+import shutil
+import sqlite3
+import tempfile
+import threading
 import unittest
+from unittest import mock
 from datetime import datetime
 from climber import Climber
 from expedition import Expedition
 from mountain import Mountain
+import climbersapp
 from climbersreporter import Reporter
+from expeditionwriter import ExpeditionWriter, RejectedRecordsError
+import exporter
+import loadtest
+import memorybudget
+from batchrunner import ReportJob, nightly_jobs, run_batch
+import serialization
+from warmup import CallLog, RecordingReporter, Warmup
+import sketches
 
 
 class TestReporter(unittest.TestCase):
@@ -159,5 +178,1166 @@ class TestReporter(unittest.TestCase):
         self.assertTrue(mountain is None or isinstance(mountain, Mountain))
 
 
+class DatabaseCopyTestCase(unittest.TestCase):
+    """Base class that gives every test its own copy of climbersapp.db."""
+
+    def setUp(self) -> None:
+        # Work on a copy so indexes and derived tables never touch the original
+        self.tmp_dir = tempfile.mkdtemp()
+        self.db_path = os.path.join(self.tmp_dir, "climbersapp.db")
+        shutil.copy(
+            os.path.join(os.path.dirname(os.path.abspath(__file__)), "climbersapp.db"),
+            self.db_path,
+        )
+        self.reporter = Reporter()
+        self.reporter.initialize_database(self.db_path)
+
+    def tearDown(self) -> None:
+        self.reporter.connection.close()
+        shutil.rmtree(self.tmp_dir)
+
+
+class TestTimeRangeReports(DatabaseCopyTestCase):
+    """Unit tests for the date-bucketed range reports."""
+
+    def test_count_expeditions_between(self) -> None:
+        # Test if the range count matches the number of expeditions in range
+        count = self.reporter.count_expeditions_between(
+            datetime(1990, 1, 1), datetime(2000, 1, 1)
+        )
+        self.assertEqual(count, 4)
+
+    def test_count_expeditions_between_empty(self) -> None:
+        # Test if a range without expeditions counts zero
+        count = self.reporter.count_expeditions_between(
+            datetime(1800, 1, 1), datetime(1800, 12, 31)
+        )
+        self.assertEqual(count, 0)
+
+    def test_expedition_histogram_matches_total(self) -> None:
+        # Test if the yearly histogram adds up to all expeditions
+        histogram = self.reporter.expedition_histogram(
+            datetime(1900, 1, 1), datetime(2100, 1, 1)
+        )
+        self.assertEqual(sum(row[1] for row in histogram), 20)
+        for period, expeditions, successes, rate in histogram:
+            self.assertRegex(period, r"^\d{4}$")
+            self.assertLessEqual(successes, expeditions)
+            self.assertAlmostEqual(rate, successes / expeditions)
+
+    def test_expedition_histogram_per_month(self) -> None:
+        # Test if monthly buckets are labelled YYYY-MM
+        histogram = self.reporter.expedition_histogram(
+            datetime(1990, 1, 1), datetime(2000, 1, 1), per="month"
+        )
+        self.assertEqual([row[0] for row in histogram][0], "1990-10")
+        self.assertEqual(sum(row[1] for row in histogram), 4)
+
+    def test_range_query_uses_date_index(self) -> None:
+        # Test if ingest builds the index and the year/month rollup
+        writer = ExpeditionWriter(self.db_path)
+        writer.start()
+        writer.stop()
+        self.reporter.cursor.execute(
+            "EXPLAIN QUERY PLAN SELECT COUNT(*) FROM expeditions "
+            "WHERE mountain_id = 33 AND date BETWEEN '1990-01-01' AND '1995-01-01'"
+        )
+        plan = " ".join(row[-1] for row in self.reporter.cursor.fetchall())
+        self.assertIn("idx_expeditions_mountain_date", plan)
+        self.reporter.cursor.execute("SELECT SUM(expeditions) FROM expedition_buckets")
+        self.assertEqual(self.reporter.cursor.fetchone()[0], 20)
+
+    def test_reader_never_waits_for_schema_lock(self) -> None:
+        # Test if a report does not write, and sees the schema once ingest adds it
+        connection = sqlite3.connect(self.db_path)
+        connection.execute("PRAGMA journal_mode=WAL")
+        connection.execute("BEGIN IMMEDIATE")
+        started = datetime.now()
+        count = self.reporter.count_expeditions_between(
+            datetime(1990, 1, 1), datetime(2000, 1, 1)
+        )
+        self.assertLess((datetime.now() - started).total_seconds(), 1)
+        self.assertEqual(count, 4)
+        self.assertFalse(self.reporter._has_time_index())
+        connection.rollback()
+        connection.close()
+
+        writer = ExpeditionWriter(self.db_path)
+        writer.start()
+        writer.stop()
+        self.assertTrue(self.reporter._has_time_index())
+
+    def test_expedition_histogram_invalid_period(self) -> None:
+        # Test if an unknown bucket size is rejected
+        with self.assertRaises(ValueError):
+            self.reporter.expedition_histogram(
+                datetime(1990, 1, 1), datetime(2000, 1, 1), per="week"
+            )
+
+
+class TestDemographics(DatabaseCopyTestCase):
+    """Unit tests for the bulk age reports."""
+
+    def test_youngest_and_oldest_summiteers(self) -> None:
+        # Test if SQL ages agree with Climber.get_age on the expedition date
+        (youngest, young_age), (oldest, old_age) = (
+            self.reporter.youngest_and_oldest_summiteers()
+        )
+        self.assertLessEqual(young_age, old_age)
+        self.assertEqual((young_age, old_age), (21, 107))
+        self.assertEqual(youngest.get_age(datetime(1968, 1, 1).date()), 23)
+        self.assertIsInstance(oldest, Climber)
+
+    def test_age_statistics_covers_all_climbers(self) -> None:
+        # Test if every climber is counted exactly once
+        stats = self.reporter.age_statistics("nationality")
+        self.assertEqual(sum(row[1] for row in stats), 368)
+        for _, _, youngest, oldest, average in stats:
+            self.assertLessEqual(youngest, average)
+            self.assertLessEqual(average, oldest)
+
+    def test_age_histogram_matches_statistics(self) -> None:
+        # Test if histogram buckets add up to the per-mountain totals
+        stats = {row[0]: row[1] for row in self.reporter.age_statistics()}
+        totals = {}
+        for mountain, bucket, count in self.reporter.age_histogram(bucket_size=5):
+            self.assertEqual(bucket % 5, 0)
+            totals[mountain] = totals.get(mountain, 0) + count
+        self.assertEqual(totals, stats)
+
+    def test_age_statistics_invalid_group(self) -> None:
+        # Test if an unknown grouping is rejected
+        with self.assertRaises(ValueError):
+            self.reporter.age_statistics("shoe_size")
+
+
+def make_expedition_record(name: str = "A test climb", date: str = "2020-05-01") -> dict:
+    # Builds an expedition record in the expeditions.json layout
+    return {
+        "name": name,
+        "mountain": {
+            "name": "Saltoro Kangri",
+            "rank": 33,
+            "range": "Saltoro Karakoram",
+            "prominence": 2160,
+            "height": 7742,
+            "countries": ["India"],
+        },
+        "date": date,
+        "country": "China",
+        "start": "Nepal",
+        "duration": "12H30",
+        "success": True,
+        "climbers": [
+            {
+                "first_name": "Test",
+                "last_name": "Climber",
+                "nationality": "Sweden",
+                "date_of_birth": "01-02-1990",
+            }
+        ],
+    }
+
+
+class TestExpeditionWriter(DatabaseCopyTestCase):
+    """Unit tests for the background expedition writer."""
+
+    def setUp(self) -> None:
+        super().setUp()
+        self.writer = ExpeditionWriter(self.db_path, max_batch_delay=0.01)
+        self.writer.start()
+
+    def tearDown(self) -> None:
+        self.writer.stop()
+        super().tearDown()
+
+    def test_submitted_expeditions_become_visible(self) -> None:
+        # Test if flushed records can be read and publish a new version
+        before = self.reporter.dataset_version()
+        for i in range(3):
+            self.writer.submit(make_expedition_record(f"Climb {i}"))
+        version = self.writer.flush()
+        self.assertGreater(version, before)
+        self.assertEqual(self.reporter.dataset_version(), version)
+        self.assertEqual(self.reporter.total_amount_of_climbers(), 371)
+        self.assertEqual(
+            self.reporter.count_expeditions_between(
+                datetime(2020, 1, 1), datetime(2020, 12, 31)
+            ),
+            3,
+        )
+
+    def test_snapshot_does_not_see_concurrent_commits(self) -> None:
+        # Test if a reader snapshot stays consistent while the writer commits
+        with self.reporter.snapshot() as version:
+            self.writer.submit(make_expedition_record())
+            self.writer.flush()
+            self.assertEqual(self.reporter.total_amount_of_climbers(), 368)
+            self.assertEqual(self.reporter.dataset_version(), version)
+        self.assertEqual(self.reporter.total_amount_of_climbers(), 369)
+
+    def test_invalid_record_raises_on_flush(self) -> None:
+        # Test if a broken record is reported to the caller and rolled back
+        record = make_expedition_record()
+        del record["climbers"]
+        self.writer.submit(record)
+        with self.assertRaises(RejectedRecordsError) as raised:
+            self.writer.flush()
+        self.assertIsInstance(raised.exception.records[0][1], KeyError)
+        self.assertEqual(self.reporter.total_amount_of_climbers(), 368)
+
+    def test_bad_records_do_not_drop_their_batch(self) -> None:
+        # Test if only the bad records of a batch are rejected
+        missing_climbers = make_expedition_record("No climbers")
+        del missing_climbers["climbers"]
+        int_duration = make_expedition_record("Int duration")
+        int_duration["duration"] = 750
+        self.writer.submit(missing_climbers)
+        for i in range(5):
+            self.writer.submit(make_expedition_record(f"Climb {i}"))
+        self.writer.submit(int_duration)
+        with self.assertRaises(RejectedRecordsError) as raised:
+            self.writer.flush()
+        names = [record["name"] for record, _ in raised.exception.records]
+        self.assertEqual(names, ["No climbers", "Int duration"])
+        self.assertEqual(self.reporter.total_amount_of_climbers(), 373)
+
+        # The writer keeps running after any kind of bad record
+        self.writer.submit(make_expedition_record("Later"))
+        self.writer.flush()
+        self.assertEqual(self.reporter.total_amount_of_climbers(), 374)
+
+
+class TestLeaderboards(DatabaseCopyTestCase):
+    """Unit tests for the top-K leaderboard engine."""
+
+    def test_top_k_heights_are_sorted(self) -> None:
+        # Test if the highest mountain heads the height leaderboard
+        leaderboard = self.reporter.top_k("height", 3)
+        self.assertEqual(len(leaderboard), 3)
+        self.assertEqual([row[1] for row in leaderboard], [1, 2, 3])
+        self.assertEqual(leaderboard[0][3].name, "Dhaulagiri I")
+        heights = [row[2] for row in leaderboard]
+        self.assertEqual(heights, sorted(heights, reverse=True))
+
+    def test_top_k_keeps_ties(self) -> None:
+        # Test if mountains with the same number of expeditions share rank 1
+        leaderboard = self.reporter.top_k("expeditions", 1)
+        self.assertEqual(len(leaderboard), 2)
+        self.assertEqual({row[1] for row in leaderboard}, {1})
+        self.assertEqual({row[2] for row in leaderboard}, {2})
+
+    def test_top_k_per_partition(self) -> None:
+        # Test if every country gets its own longest successful expedition
+        leaderboard = self.reporter.top_k(
+            "duration", 1, partition_by="country", only_succesful=True
+        )
+        countries = [row[0] for row in leaderboard]
+        self.assertEqual(len(countries), len(set(countries)))
+        for country, rank, duration, expedition in leaderboard:
+            self.assertIsInstance(expedition, Expedition)
+            self.assertEqual(expedition.country, country)
+            self.assertEqual(expedition.duration, duration)
+            self.assertTrue(expedition.success)
+
+    def test_top_k_ascending(self) -> None:
+        # Test if ascending order agrees with the shortest expedition
+        _, shortest = self.reporter.longest_and_shortest_expedition()
+        leaderboard = self.reporter.top_k("duration", 1, ascending=True)
+        self.assertEqual(leaderboard[0][3].id, shortest.id)
+
+    def test_top_k_invalid_arguments(self) -> None:
+        # Test if unknown metrics and partitions are rejected
+        with self.assertRaises(ValueError):
+            self.reporter.top_k("weight")
+        with self.assertRaises(ValueError):
+            self.reporter.top_k("height", partition_by="year")
+
+
+class TestClimberGraph(DatabaseCopyTestCase):
+    """Unit tests for the climber co-participation graph."""
+
+    def setUp(self) -> None:
+        super().setUp()
+        self.graph = self.reporter.climber_graph()
+
+    def test_nodes_are_unique_climbers(self) -> None:
+        # Test if every distinct climber identity becomes exactly one node
+        self.assertEqual(
+            self.graph.node_count(), self.reporter.total_amount_of_unique_climbers()
+        )
+
+    def test_partners_shared_an_expedition(self) -> None:
+        # Test if the best connected climber's partners all climbed with them
+        identity, degree = self.graph.degree_ranking(1)[0]
+        self.assertEqual(self.graph.degree(identity), degree)
+        partners = self.graph.frequent_partners(identity, n=degree)
+        self.assertEqual(len(partners), degree)
+        for _, shared in partners:
+            self.assertGreaterEqual(shared, 1)
+
+    def test_connected_components_cover_all_climbers(self) -> None:
+        # Test if components partition the nodes, largest first
+        components = self.graph.connected_components()
+        sizes = [len(group) for group in components]
+        self.assertEqual(sum(sizes), self.graph.node_count())
+        self.assertEqual(sizes, sorted(sizes, reverse=True))
+
+    def test_incremental_update_matches_rebuild(self) -> None:
+        # Test if updating after ingest gives the same graph as a rebuild
+        record = make_expedition_record()
+        record["climbers"].append(
+            {
+                "first_name": "Bettine",
+                "last_name": "Ratley",
+                "nationality": "China",
+                "date_of_birth": "26-01-1909",
+            }
+        )
+        writer = ExpeditionWriter(self.db_path, max_batch_delay=0.01)
+        writer.start()
+        writer.submit(record)
+        writer.flush()
+        writer.stop()
+
+        self.assertEqual(self.graph.update(self.reporter.cursor), 2)
+        rebuilt = self.reporter.climber_graph()
+        self.assertEqual(self.graph.node_count(), rebuilt.node_count())
+        self.assertEqual(self.graph.edge_count(), rebuilt.edge_count())
+        bettine = ("Bettine", "Ratley", "China", "1909-01-26")
+        self.assertEqual(
+            self.graph.frequent_partners(bettine, 3),
+            rebuilt.frequent_partners(bettine, 3),
+        )
+        self.assertEqual(self.graph.update(self.reporter.cursor), 0)
+
+    def test_repeated_member_is_not_counted_twice(self) -> None:
+        # Test if a second row for a climber already on an expedition adds no weight
+        self.reporter.cursor.execute(
+            "SELECT first_name, last_name, nationality, date_of_birth, expedition_id "
+            "FROM climbers WHERE expedition_id = 1 LIMIT 1"
+        )
+        row = self.reporter.cursor.fetchone()
+        connection = sqlite3.connect(self.db_path)
+        connection.execute(
+            "INSERT INTO climbers (first_name, last_name, nationality, "
+            "date_of_birth, expedition_id) VALUES (?, ?, ?, ?, ?)",
+            row,
+        )
+        connection.commit()
+        connection.close()
+
+        self.assertEqual(self.graph.update(self.reporter.cursor), 1)
+        rebuilt = self.reporter.climber_graph()
+        for identity in rebuilt.identities:
+            self.assertEqual(
+                sorted(self.graph.frequent_partners(identity, n=1000)),
+                sorted(rebuilt.frequent_partners(identity, n=1000)),
+            )
+
+
+class TestReadReplica(DatabaseCopyTestCase):
+    """Unit tests for the read-only replica modes."""
+
+    def test_memory_replica_answers_like_disk(self) -> None:
+        # Test if the in-memory copy returns the same results as the file
+        replica = Reporter()
+        replica.initialize_database(self.db_path, replica="memory")
+        self.assertEqual(replica.total_amount_of_climbers(), 368)
+        self.assertEqual(
+            replica.highest_mountain().name, self.reporter.highest_mountain().name
+        )
+        replica.connection.close()
+
+    def test_memory_replica_refreshes_on_new_version(self) -> None:
+        # Test if the replica only reloads after the dataset version changes
+        replica = Reporter()
+        replica.initialize_database(self.db_path, replica="memory")
+        self.assertFalse(replica.refresh_replica())
+
+        writer = ExpeditionWriter(self.db_path, max_batch_delay=0.01)
+        writer.start()
+        writer.submit(make_expedition_record())
+        version = writer.flush()
+        writer.stop()
+
+        self.assertEqual(replica.total_amount_of_climbers(), 368)
+        self.assertTrue(replica.refresh_replica())
+        self.assertEqual(replica.replica_version, version)
+        self.assertEqual(replica.total_amount_of_climbers(), 369)
+        replica.connection.close()
+
+    def test_mmap_replica_is_read_only(self) -> None:
+        # Test if the mmap replica can report but never writes
+        replica = Reporter()
+        replica.initialize_database(self.db_path, replica="mmap")
+        count = replica.count_expeditions_between(
+            datetime(1990, 1, 1), datetime(2000, 1, 1)
+        )
+        self.assertEqual(count, 4)
+        with self.assertRaises(sqlite3.OperationalError):
+            replica.cursor.execute("DELETE FROM climbers")
+        replica.connection.close()
+
+    def test_invalid_replica_mode(self) -> None:
+        # Test if an unknown replica mode is rejected
+        with self.assertRaises(ValueError):
+            Reporter().initialize_database(self.db_path, replica="disk")
+
+
+class TestBatchRunner(DatabaseCopyTestCase):
+    """Unit tests for the process-pool report batch runner."""
+
+    def test_run_batch_writes_every_output(self) -> None:
+        # Test if each job reports its result size and writes its file
+        jobs = [
+            ReportJob(
+                "get_climbers_from_country",
+                ("Sweden",),
+                os.path.join(self.tmp_dir, "sweden.csv"),
+            ),
+            ReportJob(
+                "get_mountains_in_country",
+                ("Nepal",),
+                os.path.join(self.tmp_dir, "nepal.jsonl"),
+                fmt="jsonl",
+            ),
+            ReportJob("get_mountains_in_country", ("Atlantis",)),
+        ]
+        results = run_batch(self.db_path, jobs, max_workers=2)
+        self.assertEqual([r[0] for r in results], jobs)
+        self.assertEqual(results[0][1], len(self.reporter.get_climbers_from_country("Sweden")))
+        self.assertEqual(results[2][1:], (0, None))
+        for _, _, path in results[:2]:
+            self.assertTrue(os.path.exists(path))
+
+    def test_run_batch_deduplicates_jobs(self) -> None:
+        # Test if identical jobs share one result and one output file
+        path = os.path.join(self.tmp_dir, "sweden.csv")
+        jobs = [ReportJob("get_climbers_from_country", ("Sweden",), path)] * 3
+        results = run_batch(self.db_path, jobs, max_workers=2)
+        self.assertEqual({(r[1], r[2]) for r in results}, {(results[0][1], path)})
+
+    def test_nightly_jobs_cover_every_nationality(self) -> None:
+        # Test if the nightly list has one climber report per nationality
+        jobs = nightly_jobs(self.db_path, self.tmp_dir)
+        nationalities = {
+            job.args[0] for job in jobs if job.report == "get_climbers_from_country"
+        }
+        self.reporter.cursor.execute("SELECT COUNT(DISTINCT nationality) FROM climbers")
+        self.assertEqual(len(nationalities), self.reporter.cursor.fetchone()[0])
+
+    def test_nightly_jobs_cover_border_countries(self) -> None:
+        # Test if a country that is only a second country of a peak gets a report
+        record = make_expedition_record()
+        record["mountain"]["countries"] = ["India", "Atlantis"]
+        writer = ExpeditionWriter(self.db_path, max_batch_delay=0.01)
+        writer.start()
+        writer.submit(record)
+        writer.flush()
+        writer.stop()
+        countries = {
+            job.args[0]
+            for job in nightly_jobs(self.db_path, self.tmp_dir)
+            if job.report == "get_mountains_in_country"
+        }
+        self.assertIn("Atlantis", countries)
+
+    def test_unknown_report(self) -> None:
+        # Test if a job for a method Reporter does not have is rejected
+        with self.assertRaises(ValueError):
+            ReportJob("drop_all_tables")
+
+    def test_reporter_setup_is_not_a_report(self) -> None:
+        # Test if methods that change the shared Reporter are rejected
+        for method in ("initialize_database", "snapshot", "set_memory_budget"):
+            with self.assertRaises(ValueError):
+                ReportJob(method, (self.db_path,))
+
+
+class TestMemoryBudget(DatabaseCopyTestCase):
+    """Unit tests for bounded-memory list reports."""
+
+    def test_without_budget_result_is_a_tuple(self) -> None:
+        # Test if results stay tuples and stats are recorded
+        climbers = self.reporter.get_climbers_from_country("China")
+        stats = self.reporter.last_query_stats
+        self.assertIsInstance(climbers, tuple)
+        self.assertEqual(stats.rows, len(climbers))
+        self.assertGreater(stats.peak_bytes, 0)
+        self.assertFalse(stats.spilled)
+
+    def test_row_budget_spills_to_disk(self) -> None:
+        # Test if a result over the row budget is spilled but complete
+        expected = self.reporter.get_climbers_from_country("China")
+        self.reporter.set_memory_budget(max_rows=10, batch_size=4)
+        climbers = self.reporter.get_climbers_from_country("China")
+        stats = self.reporter.last_query_stats
+        self.assertTrue(stats.spilled)
+        self.assertEqual(len(climbers), len(expected))
+        self.assertEqual([c.id for c in climbers], [c.id for c in expected])
+        # A spilled result can be read more than once
+        self.assertEqual(len(list(climbers)), len(expected))
+        climbers.close()
+
+    def test_byte_budget_bounds_peak_memory(self) -> None:
+        # Test if peak memory stays near the byte budget once spilled
+        self.reporter.get_climbers_from_country("China")
+        unbounded = self.reporter.last_query_stats.peak_bytes
+        self.reporter.set_memory_budget(max_bytes=unbounded // 10, batch_size=2)
+        self.reporter.get_climbers_from_country("China").close()
+        self.assertLess(self.reporter.last_query_stats.peak_bytes, unbounded // 2)
+
+    def test_byte_budget_counts_built_objects(self) -> None:
+        # Test if the model objects count against the budget, not only the rows
+        self.reporter.cursor.execute(
+            "SELECT * FROM climbers WHERE LOWER(nationality) = LOWER(?)", ("China",)
+        )
+        rows_only = sum(memorybudget.row_size(row) for row in self.reporter.cursor)
+        self.reporter.get_climbers_from_country("China")
+        self.assertGreater(self.reporter.last_query_stats.peak_bytes, 2 * rows_only)
+        self.reporter.set_memory_budget(max_bytes=rows_only, batch_size=2)
+        climbers = self.reporter.get_climbers_from_country("China")
+        self.assertTrue(self.reporter.last_query_stats.spilled)
+        self.assertEqual(len(list(climbers)), len(climbers))
+        climbers.close()
+
+    def test_spilled_result_can_be_exported(self) -> None:
+        # Test if a spilled result streams into the exporter
+        self.reporter.set_memory_budget(max_rows=1)
+        climbers = self.reporter.get_climbers_from_country("China")
+        path = exporter.export_report(climbers, os.path.join(self.tmp_dir, "c.csv"))
+        with open(path, encoding="utf-8") as f:
+            self.assertEqual(len(f.read().splitlines()), len(climbers) + 1)
+        climbers.close()
+
+    def test_small_results_fit_the_budget(self) -> None:
+        # Test if results within the budget are still plain tuples
+        self.reporter.set_memory_budget(max_rows=1000)
+        self.assertEqual(self.reporter.get_climbers_from_country("Narnia"), ())
+
+
+class TestSerialization(DatabaseCopyTestCase):
+    """Unit tests for the binary model encoding."""
+
+    def test_round_trip_keeps_every_field(self) -> None:
+        # Test if a mixed batch decodes to equal objects in the same order
+        objects = (
+            self.reporter.get_climbers_from_country("China")
+            + self.reporter.get_mountains_in_country("Nepal")
+            + (self.reporter.get_first_expedition(), Mountain(1, "X", "Y", 1, 1))
+        )
+        decoded = serialization.decode_batch(serialization.encode_batch(objects))
+        self.assertEqual([repr(o) for o in decoded], [repr(o) for o in objects])
+        self.assertIsInstance(decoded[-2].date, datetime)
+        self.assertIsNone(decoded[-1].range)
+
+    def test_missing_strings_round_trip(self) -> None:
+        # Test if None in any string field decodes back to None
+        expedition = Expedition(1, None, 33, None, datetime(2020, 5, 1), None, 90, 1)
+        decoded = serialization.decode(serialization.encode(expedition))
+        self.assertEqual(repr(decoded), repr(expedition))
+        self.assertIsNone(decoded.start)
+
+    def test_single_object(self) -> None:
+        # Test if encode/decode work on one object
+        mountain = self.reporter.highest_mountain()
+        self.assertEqual(
+            repr(serialization.decode(serialization.encode(mountain))), repr(mountain)
+        )
+
+    def test_strings_are_interned(self) -> None:
+        # Test if repeated strings are stored only once per batch
+        climbers = self.reporter.get_climbers_from_country("China")
+        one = len(serialization.encode_batch(climbers))
+        many = len(serialization.encode_batch(climbers * 10))
+        self.assertLess(many, one * 10)
+
+    def test_rejects_other_versions(self) -> None:
+        # Test if data from another format version is refused
+        data = bytearray(serialization.encode(self.reporter.highest_mountain()))
+        data[4] = serialization.VERSION + 1
+        with self.assertRaises(ValueError):
+            serialization.decode_batch(bytes(data))
+
+    def test_benchmark_reports_every_format(self) -> None:
+        # Test if the benchmark compares binary with pickle and JSON
+        climbers = self.reporter.get_climbers_from_country("China")
+        results = serialization.benchmark(climbers, repeat=1)
+        self.assertEqual(set(results), {"binary", "pickle", "json"})
+        self.assertLess(results["binary"]["bytes"], results["json"]["bytes"])
+
+
+def create_empty_database(reporter: Reporter, tmp_dir: str) -> sqlite3.Connection:
+    """Creates empty.db in tmp_dir with the base tables of the reporter's database."""
+    empty = sqlite3.connect(os.path.join(tmp_dir, "empty.db"))
+    reporter.cursor.execute(
+        "SELECT sql FROM sqlite_master WHERE type = 'table' "
+        "AND name IN ('climbers', 'expeditions', 'mountains')"
+    )
+    for (sql,) in reporter.cursor.fetchall():
+        empty.execute(sql)
+    return empty
+
+
+class TestMountainDimensions(DatabaseCopyTestCase):
+    """Unit tests for mountain dimension handling during ingest."""
+
+    def load_into_empty_database(self) -> sqlite3.Connection:
+        # Loads expeditions.json into an empty database with the same tables
+        empty = create_empty_database(self.reporter, self.tmp_dir)
+        statements = []
+        empty.set_trace_callback(statements.append)
+        with mock.patch.object(climbersapp, "connection", empty), mock.patch.object(
+            climbersapp, "cursor", empty.cursor()
+        ):
+            climbersapp.load_json_and_insert()
+        empty.set_trace_callback(None)
+        self.statements = statements
+        return empty
+
+    def test_each_mountain_is_written_once(self) -> None:
+        # Test if repeated mountains in the dump are not written again
+        empty = self.load_into_empty_database()
+        writes = [s for s in self.statements if "INTO mountains" in s]
+        mountains = empty.execute("SELECT COUNT(*) FROM mountains").fetchone()[0]
+        self.assertEqual(len(writes), mountains)
+        empty.close()
+
+    def test_all_countries_are_linked(self) -> None:
+        # Test if every country of a mountain ends up in the link table
+        with open(climbersapp.json_path, encoding="utf-8") as f:
+            expected = {
+                (country, e["mountain"]["rank"])
+                for e in json.load(f)
+                for country in e["mountain"]["countries"]
+            }
+        empty = self.load_into_empty_database()
+        linked = set(empty.execute("SELECT country, mountain_id FROM mountain_countries"))
+        self.assertEqual(linked, expected)
+        empty.close()
+
+    def test_border_peak_found_in_every_country(self) -> None:
+        # Test if a mountain listed under two countries is found in both
+        record = make_expedition_record()
+        record["mountain"]["countries"] = ["India", "Pakistan"]
+        writer = ExpeditionWriter(self.db_path, max_batch_delay=0.01)
+        writer.start()
+        writer.submit(record)
+        writer.flush()
+        writer.stop()
+        for country in ("India", "pakistan"):
+            names = [m.name for m in self.reporter.get_mountains_in_country(country)]
+            self.assertIn("Saltoro Kangri", names)
+
+    def test_later_record_adds_its_countries(self) -> None:
+        # Test if a repeated mountain still gets the countries it adds
+        first, second = make_expedition_record("First"), make_expedition_record("Second")
+        for record, countries in ((first, ["India"]), (second, ["India", "Pakistan"])):
+            record["mountain"]["rank"] = 999
+            record["mountain"]["countries"] = countries
+        writer = ExpeditionWriter(self.db_path, max_batch_delay=0.01)
+        writer.start()
+        writer.submit(first)
+        writer.submit(second)
+        writer.flush()
+        writer.stop()
+        self.reporter.cursor.execute(
+            "SELECT country FROM mountain_countries WHERE mountain_id = 999"
+        )
+        self.assertEqual(
+            {row[0] for row in self.reporter.cursor.fetchall()}, {"India", "Pakistan"}
+        )
+
+
+class TestCheckpointedIngest(DatabaseCopyTestCase):
+    """Unit tests for resuming an interrupted load_json_and_insert."""
+
+    def setUp(self) -> None:
+        super().setUp()
+        self.empty = create_empty_database(self.reporter, self.tmp_dir)
+        patcher = mock.patch.multiple(
+            climbersapp, connection=self.empty, cursor=self.empty.cursor()
+        )
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.addCleanup(self.empty.close)
+
+    def crash_after(self, calls: int) -> None:
+        # Runs a load whose insert fails after the given number of expeditions
+        insert = climbersapp.insert_expedition
+        done = []
+
+        def failing_insert(*args):
+            if len(done) == calls:
+                raise RuntimeError("Simulated crash")
+            done.append(args)
+            return insert(*args)
+
+        with mock.patch.object(climbersapp, "insert_expedition", failing_insert):
+            with self.assertRaises(RuntimeError):
+                climbersapp.load_json_and_insert(segment_size=5)
+
+    def count(self, table: str) -> int:
+        return self.empty.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+
+    def test_crash_keeps_committed_segments(self) -> None:
+        # Test if a crash only loses the unfinished segment
+        self.crash_after(7)
+        self.assertEqual(self.count("expeditions"), 5)
+        self.assertEqual(climbersapp.get_ingest_checkpoint()["position"], 5)
+
+    def test_resume_loads_every_expedition_once(self) -> None:
+        # Test if resuming gives the same data as one uninterrupted load
+        self.crash_after(7)
+        climbersapp.load_json_and_insert(segment_size=5)
+        self.reporter.cursor.execute("SELECT COUNT(*) FROM expeditions")
+        self.assertEqual(self.count("expeditions"), self.reporter.cursor.fetchone()[0])
+        self.reporter.cursor.execute("SELECT COUNT(*) FROM climbers")
+        self.assertEqual(self.count("climbers"), self.reporter.cursor.fetchone()[0])
+        buckets = self.empty.execute(
+            "SELECT SUM(expeditions) FROM expedition_buckets"
+        ).fetchone()[0]
+        self.assertEqual(buckets, self.count("expeditions"))
+        self.assertIsNone(climbersapp.get_ingest_checkpoint())
+
+    def test_resume_refuses_other_dump(self) -> None:
+        # Test if a checkpoint is not applied to a different dump
+        self.crash_after(7)
+        other = os.path.join(self.tmp_dir, "other.json")
+        with open(other, "w", encoding="utf-8") as f:
+            json.dump([make_expedition_record()], f)
+        with mock.patch.object(climbersapp, "json_path", other):
+            with self.assertRaises(ValueError):
+                climbersapp.load_json_and_insert(segment_size=5)
+
+
+class TestLoadTest(unittest.TestCase):
+    """Unit tests for the load-testing harness."""
+
+    def setUp(self) -> None:
+        self.tmp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmp_dir)
+        self.db_path = os.path.join(self.tmp_dir, "loadtest.db")
+        self.expeditions = loadtest.build_synthetic_database(self.db_path, scale=3)
+
+    def test_synthetic_database_size(self) -> None:
+        # Test if every copy of the dump ends up in the database
+        connection = sqlite3.connect(self.db_path)
+        count = connection.execute("SELECT COUNT(*) FROM expeditions").fetchone()[0]
+        connection.close()
+        self.assertEqual(count, self.expeditions)
+        self.assertEqual(self.expeditions, 60)
+
+    def test_threads_complete_every_call(self) -> None:
+        # Test if all calls are measured and the app connection is restored
+        connection = climbersapp.connection
+        result = loadtest.run_load_test(self.db_path, workers=4, operations=25)
+        self.assertEqual(result.calls, 100)
+        self.assertFalse(result.errors)
+        self.assertLessEqual(result.percentile(50), result.percentile(99))
+        self.assertIs(climbersapp.connection, connection)
+
+    def test_percentile_is_nearest_rank(self) -> None:
+        # Test if p95 and p99 pick the nearest rank, not one above it
+        result = loadtest.LoadTestResult("thread", 1, 1.0, "shared")
+        result.add([("op", i / 1000) for i in range(1, 101)], {})
+        self.assertAlmostEqual(result.percentile(95), 95)
+        self.assertAlmostEqual(result.percentile(99), 99)
+        result = loadtest.LoadTestResult("thread", 1, 1.0, "shared")
+        result.add([("op", i / 1000) for i in range(1, 21)], {})
+        self.assertAlmostEqual(result.percentile(95), 19)
+
+    def test_lock_contention_is_counted(self) -> None:
+        # Test if writes blocked by another writer count as locked errors
+        blocker = sqlite3.connect(self.db_path)
+        blocker.execute("BEGIN IMMEDIATE")
+        try:
+            result = loadtest.run_load_test(
+                self.db_path,
+                workers=2,
+                operations=3,
+                mix={"insert_expedition": 1},
+                timeout=0.01,
+            )
+        finally:
+            blocker.rollback()
+            blocker.close()
+        self.assertEqual(result.locked_errors, 6)
+
+
+class TestLazyReference(unittest.TestCase):
+    """Unit tests for lazy references returned by the model getters."""
+
+    def setUp(self) -> None:
+        self.queries = []
+        climbersapp.connection.set_trace_callback(self.queries.append)
+        self.addCleanup(climbersapp.connection.set_trace_callback, None)
+
+    def test_key_needs_no_query(self) -> None:
+        # Test if reading the foreign key does not touch the database
+        climber = Climber(1, "A", "B", "Nepal", datetime(1990, 1, 1).date(), 1)
+        expedition = climber.get_expedition(lazy=True)
+        self.assertEqual(expedition.id, 1)
+        self.assertIsInstance(expedition, Expedition)
+        self.assertEqual(self.queries, [])
+
+    def test_pending_references_load_in_one_query(self) -> None:
+        # Test if all unloaded references are fetched together
+        expeditions = [climbersapp.get_expedition_by_id(i) for i in (1, 2, 3)]
+        self.queries.clear()
+        mountains = [e.get_mountain(lazy=True) for e in expeditions]
+        names = [m.name for m in mountains]
+        self.assertEqual(len(self.queries), 1)
+        self.assertIn(" IN ", self.queries[0])
+        expected = [climbersapp.get_mountain_by_rank(e.mountain_id).name for e in expeditions]
+        self.assertEqual(names, expected)
+
+    def test_other_threads_references_stay_unloaded(self) -> None:
+        # Test if loading one reference leaves other threads' references alone
+        from lazyreference import MountainReference, is_loaded
+
+        others = []
+        thread = threading.Thread(
+            target=lambda: others.extend(MountainReference(r) for r in (1, 2))
+        )
+        thread.start()
+        thread.join()
+        mountain = MountainReference(3)
+        fetch = mock.Mock(return_value={3: Mountain(3, "C", "Nepal", 8000, 500, "R")})
+        with mock.patch.object(MountainReference, "fetch", fetch):
+            self.assertEqual(mountain.name, "C")
+        fetch.assert_called_once_with([3])
+        self.assertFalse(any(is_loaded(other) for other in others))
+
+    def loaded_mountain_reference(self):
+        # Returns a reference whose fetch yields a fixed mountain, no database
+        from lazyreference import MountainReference
+
+        mountain = Mountain(3, "C", "Nepal", 8000, 500, "R")
+        patcher = mock.patch.object(
+            MountainReference, "fetch", mock.Mock(return_value={3: mountain})
+        )
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        return MountainReference(3)
+
+    def test_copy_and_pickle_give_the_full_object(self) -> None:
+        # Test if copies of a reference are plain, equal Mountain objects
+        for make_copy in (
+            copy.copy,
+            copy.deepcopy,
+            lambda reference: pickle.loads(pickle.dumps(reference)),
+        ):
+            result = make_copy(self.loaded_mountain_reference())
+            self.assertIs(type(result), Mountain)
+            self.assertEqual((result.rank, result.name), (3, "C"))
+
+    def test_export_reference(self) -> None:
+        # Test if a reference exports like the object it refers to
+        tmp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tmp_dir)
+        path = exporter.export_report(
+            [self.loaded_mountain_reference()], os.path.join(tmp_dir, "m.csv")
+        )
+        with open(path, encoding="utf-8") as f:
+            lines = f.read().splitlines()
+        self.assertEqual(lines[0], ",".join(exporter.COLUMNS[Mountain]))
+        self.assertEqual(lines[1], "3,C,Nepal,8000,500,R")
+
+    def test_missing_row_raises(self) -> None:
+        # Test if a reference to a missing row fails only when it is read
+        climber = Climber(1, "A", "B", "Nepal", datetime(1990, 1, 1).date(), -1)
+        expedition = climber.get_expedition(lazy=True)
+        with self.assertRaises(LookupError):
+            expedition.name
+
+
+class TestDurationStatistics(DatabaseCopyTestCase):
+    """Unit tests for the pre-aggregated duration statistics."""
+
+    def durations(self, success: int) -> list:
+        self.reporter.cursor.execute(
+            "SELECT duration FROM expeditions WHERE success = ? ORDER BY duration",
+            (success,),
+        )
+        return [row[0] for row in self.reporter.cursor.fetchall()]
+
+    def test_statistics_match_sorted_durations(self) -> None:
+        # Test if the summary gives the same numbers as sorting the table
+        for group, total, shortest, longest, mean, median, p90 in (
+            self.reporter.duration_statistics(group_by="success")
+        ):
+            durations = self.durations(int(group))
+            self.assertEqual(total, len(durations))
+            self.assertEqual((shortest, longest), (durations[0], durations[-1]))
+            self.assertAlmostEqual(mean, sum(durations) / len(durations))
+            self.assertEqual(median, durations[(len(durations) + 1) // 2 - 1])
+            self.assertEqual(p90, durations[-(-9 * len(durations) // 10) - 1])
+
+    def test_percentile_rank_is_exact(self) -> None:
+        # Test if nearest ranks are not pushed up by float rounding
+        counts = [(d, 1) for d in range(1, 101)]
+        self.assertEqual(self.reporter._quantiles(counts, 100, (7, 29, 57)), [7, 29, 57])
+
+    def test_ingest_updates_summary(self) -> None:
+        # Test if expeditions written by the writer are counted right away
+        mountain = climbersapp.get_mountain_by_rank(33)
+        self.reporter.duration_statistics()  # Builds the summary table
+        writer = ExpeditionWriter(self.db_path, max_batch_delay=0.01)
+        writer.start()
+        record = make_expedition_record()
+        record["duration"] = "99H00"
+        writer.submit(record)
+        writer.flush()
+        writer.stop()
+        self.assertEqual(self.reporter.duration_percentile(100, mountain), 99 * 60)
+
+    def test_formatted_like_convert_duration(self) -> None:
+        # Test if formatted durations use the Expedition.convert_duration format
+        longest, _ = self.reporter.longest_and_shortest_expedition()
+        rows = self.reporter.duration_statistics(group_by="success", to_format="%D:%H:%M")
+        self.assertEqual(max(row[3] for row in rows), longest.convert_duration("%D:%H:%M"))
+
+
+class TestWarmup(DatabaseCopyTestCase):
+    """Unit tests for recording and replaying Reporter calls at startup."""
+
+    def test_calls_are_counted_by_arguments(self) -> None:
+        # Test if positional and keyword calls count as the same call
+        log = CallLog()
+        recording = RecordingReporter(self.reporter, log)
+        recording.get_climbers_from_country("Sweden")
+        recording.get_climbers_from_country(country="Sweden", to_csv=False)
+        recording.highest_mountain()
+        self.assertEqual(
+            log.most_common(),
+            [("get_climbers_from_country", {"country": "Sweden"}), ("highest_mountain", {})],
+        )
+
+    def test_log_survives_save_and_load(self) -> None:
+        # Test if datetimes and mountains are restored from the JSON file
+        path = os.path.join(self.tmp_dir, "calls.json")
+        log = CallLog(path)
+        mountain = self.reporter.highest_mountain()
+        log.record("get_climbers_that_climbed_mountain_between",
+                   (mountain, datetime(1990, 1, 1), datetime(1995, 1, 1), True))
+        log.save()
+        ((report, kwargs),) = CallLog(path).most_common()
+        self.assertEqual(report, "get_climbers_that_climbed_mountain_between")
+        self.assertEqual(repr(kwargs["mountain"]), repr(mountain))
+        self.assertEqual(kwargs["start"], datetime(1990, 1, 1))
+        self.assertNotIn("to_csv", kwargs)
+
+    def test_warmup_fills_result_cache(self) -> None:
+        # Test if warm-up replays calls on a thread and reports readiness
+        reporter = Reporter()
+        reporter.initialize_database(self.db_path, check_same_thread=False)
+        reporter.enable_result_cache()
+        log = CallLog()
+        log.record("highest_mountain")
+        log.record("mountain_with_most_expeditions")
+        log.record("get_mountains_in_country", ("Atlantis",))
+        log.record("top_k", ("weight",))
+        warmup = Warmup(reporter, log)
+        warmup.start()
+        self.assertTrue(warmup.wait(10))
+        self.assertTrue(warmup.is_ready())
+        self.assertEqual(warmup.replayed, 4)
+        self.assertEqual([report for report, _ in warmup.errors], ["top_k"])
+        self.assertEqual(len(reporter.result_cache), 3)
+        self.assertIs(
+            reporter.cached("highest_mountain"), reporter.cached("highest_mountain")
+        )
+        reporter.connection.close()
+
+    def test_recorded_calls_use_warmed_cache(self) -> None:
+        # Test if traffic through RecordingReporter reads what warm-up cached
+        self.reporter.enable_result_cache()
+        log = CallLog()
+        log.record("get_mountains_in_country", ("Nepal",))
+        warmup = Warmup(self.reporter, log)
+        warmup._run()  # Same thread, so the Reporter connection can be used
+        warmed = self.reporter.cached("get_mountains_in_country", country="Nepal")
+        self.assertEqual(len(self.reporter.result_cache), 1)
+        recording = RecordingReporter(self.reporter, CallLog())
+        self.assertIs(recording.get_mountains_in_country("Nepal"), warmed)
+        self.assertIs(recording.get_mountains_in_country(country="Nepal"), warmed)
+
+    def test_spilled_results_are_not_shared(self) -> None:
+        # Test if closing one spilled result leaves later cached calls working
+        self.reporter.enable_result_cache()
+        self.reporter.set_memory_budget(max_rows=1)
+        recording = RecordingReporter(self.reporter, CallLog())
+        first = recording.get_climbers_from_country("Sweden")
+        self.assertIsInstance(first, memorybudget.SpilledResult)
+        expected = [c.id for c in first]
+        first.close()
+        again = recording.get_climbers_from_country("Sweden")
+        self.assertEqual([c.id for c in again], expected)
+        again.close()
+
+    def test_result_cache_drops_on_new_version(self) -> None:
+        # Test if cached results are dropped after new data is committed
+        self.reporter.enable_result_cache()
+        before = self.reporter.cached("total_amount_of_climbers")
+        writer = ExpeditionWriter(self.db_path, max_batch_delay=0.01)
+        writer.start()
+        writer.submit(make_expedition_record())
+        writer.flush()
+        writer.stop()
+        self.assertEqual(self.reporter.cached("total_amount_of_climbers"), before + 1)
+
+
+class TestApproximateStatistics(DatabaseCopyTestCase):
+    """Unit tests for the sketch-based approximate reports."""
+
+    def test_approximate_counts_are_close(self) -> None:
+        # Test if sketch answers are within a few percent of the exact ones
+        exact = self.reporter.total_amount_of_unique_climbers()
+        approximate = self.reporter.total_amount_of_unique_climbers(approximate=True)
+        self.assertAlmostEqual(approximate, exact, delta=exact * 0.02)
+        for country in ("China", "sweden", "Narnia"):
+            self.assertEqual(
+                self.reporter.count_climbers_from_country(country, approximate=True),
+                self.reporter.count_climbers_from_country(country),
+            )
+        self.assertEqual(
+            self.reporter.count_expeditions_in_country("China", approximate=True),
+            self.reporter.count_expeditions_in_country("China"),
+        )
+
+    def test_hyperloglog_large_stream(self) -> None:
+        # Test if the distinct count stays within 2% on a larger stream
+        sketch = sketches.HyperLogLog()
+        for i in range(50000):
+            sketch.add(f"climber-{i % 40000}")
+        restored = sketches.HyperLogLog.from_bytes(sketch.to_bytes())
+        self.assertAlmostEqual(restored.count(), 40000, delta=800)
+
+    def test_count_min_never_undercounts(self) -> None:
+        # Test if count-min estimates are at least the true counts
+        sketch = sketches.CountMinSketch(width=64, depth=3)
+        for i in range(2000):
+            sketch.add(f"country-{i % 100}", 1 + i % 3)
+        restored = sketches.CountMinSketch.from_bytes(sketch.to_bytes())
+        for i in range(100):
+            true = sum(1 + j % 3 for j in range(i, 2000, 100))
+            self.assertGreaterEqual(restored.estimate(f"country-{i}"), true)
+
+    def test_sample_expeditions(self) -> None:
+        # Test if the sample returns real, distinct expeditions
+        sample = self.reporter.sample_expeditions(5)
+        self.assertEqual(len(sample), 5)
+        self.assertEqual(len({e.id for e in sample}), 5)
+
+    def test_ingest_maintains_stored_sketches(self) -> None:
+        # Test if the writer persists sketches that include its records
+        writer = ExpeditionWriter(self.db_path, max_batch_delay=0.01)
+        writer.start()
+        writer.submit(make_expedition_record())
+        writer.flush()
+        writer.stop()
+        stored = sketches.ExpeditionSketches.load(self.reporter.cursor)
+        self.assertIsNotNone(stored)
+        self.assertEqual(stored.expeditions.seen, 21)
+        self.assertEqual(
+            self.reporter.count_climbers_from_country("Sweden", approximate=True),
+            self.reporter.count_climbers_from_country("Sweden"),
+        )
+
+    def test_side_by_side_writers_keep_each_others_sketches(self) -> None:
+        # Test if saves from two connections both reach the stored sketches
+        first, second = (sqlite3.connect(self.db_path) for _ in range(2))
+        self.addCleanup(first.close)
+        self.addCleanup(second.close)
+        sketches.ExpeditionSketches.ensure_stored(first.cursor())
+        first.commit()
+        before = sketches.ExpeditionSketches.load(first.cursor())
+        with mock.patch.object(sketches.ExpeditionSketches, "COMPACT_AFTER", 3):
+            for i, connection in enumerate((first, second, first, second)):
+                added = sketches.ExpeditionSketches()
+                added.add_expedition(1000 + i, "Atlantis")
+                added.save(connection.cursor())
+                connection.commit()
+        cursor = first.cursor()
+        cursor.execute("SELECT COUNT(*) FROM sketch_log")
+        self.assertEqual(cursor.fetchone()[0], 1)  # Compacted after the third
+        stored = sketches.ExpeditionSketches.load(cursor)
+        self.assertEqual(stored.expeditions.seen, before.expeditions.seen + 4)
+        self.assertEqual(stored.countries.estimate("Atlantis"), 4)
+
+
+class TestExporter(DatabaseCopyTestCase):
+    """Unit tests for the multi-format export engine."""
+
+    def setUp(self) -> None:
+        super().setUp()
+        self.climbers = self.reporter.get_climbers_from_country("Sweden")
+        self.mountains = self.reporter.get_mountains_in_country("Nepal")
+
+    def test_csv_export(self) -> None:
+        # Test if the CSV export has a header and one line per climber
+        path = exporter.export_report(
+            self.climbers, os.path.join(self.tmp_dir, "sweden.csv")
+        )
+        with open(path, encoding="utf-8") as f:
+            lines = f.read().splitlines()
+        self.assertEqual(lines[0], ",".join(exporter.COLUMNS[Climber]))
+        self.assertEqual(len(lines), len(self.climbers) + 1)
+
+    def test_empty_csv_export_keeps_header(self) -> None:
+        # Test if an empty result still writes the column header
+        path = exporter.export_report(
+            (), os.path.join(self.tmp_dir, "none.csv"), model=Mountain
+        )
+        with open(path, encoding="utf-8") as f:
+            self.assertEqual(f.read().strip(), ",".join(exporter.COLUMNS[Mountain]))
+
+    def test_compressed_jsonl_export(self) -> None:
+        # Test if gzip JSON Lines output can be read back
+        path = exporter.export_report(
+            self.mountains,
+            os.path.join(self.tmp_dir, "nepal.jsonl"),
+            fmt="jsonl",
+            compress=True,
+        )
+        self.assertTrue(path.endswith(".jsonl.gz"))
+        with gzip.open(path, "rt", encoding="utf-8") as f:
+            records = [json.loads(line) for line in f]
+        self.assertEqual([r["name"] for r in records], [m.name for m in self.mountains])
+
+    def test_columnar_round_trip(self) -> None:
+        # Test if the columnar format returns exactly what was written
+        path = os.path.join(self.tmp_dir, "sweden.clm")
+        columns, rows = exporter.to_rows(self.climbers)
+        rows = list(rows)
+        exporter.export_rows(path, columns, rows, fmt="columnar", chunk_size=4)
+        self.assertEqual(exporter.read_columnar(path), (columns, rows))
+
+    def test_export_reports_in_parallel(self) -> None:
+        # Test if several reports are written and returned in job order
+        jobs = [
+            {"objects": self.climbers, "path": os.path.join(self.tmp_dir, "a.csv")},
+            {
+                "objects": self.mountains,
+                "path": os.path.join(self.tmp_dir, "b"),
+                "fmt": "columnar",
+                "compress": True,
+            },
+        ]
+        paths = exporter.export_reports(jobs, max_workers=2)
+        self.assertEqual(paths[1], os.path.join(self.tmp_dir, "b.gz"))
+        for path in paths:
+            self.assertTrue(os.path.exists(path))
+
+    def test_unknown_format(self) -> None:
+        # Test if an unsupported format is rejected
+        with self.assertRaises(ValueError):
+            exporter.export_report(
+                self.climbers, os.path.join(self.tmp_dir, "x"), fmt="xml"
+            )
+
+
 if __name__ == "__main__":
     unittest.main()
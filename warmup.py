@@ -0,0 +1,243 @@
+import inspect
+import json
+import os
+import threading
+import time
+from collections import Counter
+from datetime import datetime
+
+import memorybudget
+from climbersreporter import Reporter
+from mountain import Mountain
+
+# Reporter methods that change state or write files are never recorded
+NOT_RECORDED = {
+    "initialize_database",
+    "refresh_replica",
+    "set_memory_budget",
+    "enable_result_cache",
+    "cached",
+    "snapshot",
+}
+
+
+def _encode_argument(value):
+    """Turns a report argument into something JSON can store."""
+    if isinstance(value, datetime):
+        return {"datetime": value.strftime("%Y-%m-%d %H:%M:%S")}
+    if isinstance(value, Mountain):
+        return {
+            "mountain": [
+                value.rank,
+                value.name,
+                value.country,
+                value.height,
+                value.prominence,
+                value.range,
+            ]
+        }
+    return value
+
+
+def _decode_argument(value):
+    """Reverses _encode_argument."""
+    if isinstance(value, dict) and "datetime" in value:
+        return datetime.strptime(value["datetime"], "%Y-%m-%d %H:%M:%S")
+    if isinstance(value, dict) and "mountain" in value:
+        return Mountain(*value["mountain"])
+    return value
+
+
+def _is_report(name: str) -> bool:
+    """Returns True for Reporter methods that are recorded and cached."""
+    if name.startswith("_") or name in NOT_RECORDED:
+        return False
+    return callable(getattr(Reporter, name, None))
+
+
+def _bind(report: str, args: tuple, kwargs: dict) -> dict:
+    """Returns the arguments of a report call by name, without self."""
+    bound = inspect.signature(getattr(Reporter, report)).bind(None, *args, **kwargs)
+    arguments = dict(bound.arguments)
+    arguments.pop("self")
+    return arguments
+
+
+class CallLog:
+    """
+    Counts which Reporter calls are made and with which arguments.
+
+    Arguments are stored by name, so positional and keyword calls count as
+    the same call, and to_csv is left out so a replay never writes files.
+
+    Attributes:
+        path (str): JSON file the log is saved to, or None.
+    """
+
+    def __init__(self, path: str = None) -> None:
+        """
+        Initializes a CallLog, loading earlier counts from path if it exists.
+
+        Args:
+            path (str, optional): JSON file the log is saved to.
+        """
+        self.path = path
+        self._counts = Counter()
+        self._lock = threading.Lock()
+        if path is not None and os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as f:
+                for report, kwargs, count in json.load(f):
+                    self._counts[(report, json.dumps(kwargs, sort_keys=True))] = count
+
+    def record(self, report: str, args: tuple = (), kwargs: dict = None) -> None:
+        """
+        Counts one call of a Reporter method.
+
+        Args:
+            report (str): Name of the Reporter method.
+            args (tuple): Positional arguments of the call.
+            kwargs (dict, optional): Keyword arguments of the call.
+        """
+        if not _is_report(report):
+            return
+        arguments = _bind(report, args, kwargs or {})
+        arguments.pop("to_csv", None)
+        encoded = {name: _encode_argument(value) for name, value in arguments.items()}
+        with self._lock:
+            self._counts[(report, json.dumps(encoded, sort_keys=True))] += 1
+
+    def most_common(self, n: int = None) -> list[tuple[str, dict]]:
+        """
+        Returns the most frequent calls, most frequent first.
+
+        Args:
+            n (int, optional): Number of calls to return, default all.
+
+        Returns:
+            list[tuple[str, dict]]: Method names with their keyword arguments.
+        """
+        with self._lock:
+            calls = self._counts.most_common(n)
+        return [
+            (
+                report,
+                {name: _decode_argument(v) for name, v in json.loads(kwargs).items()},
+            )
+            for (report, kwargs), _ in calls
+        ]
+
+    def save(self) -> None:
+        """Writes the counts to the JSON file."""
+        with self._lock:
+            data = [
+                [report, json.loads(kwargs), count]
+                for (report, kwargs), count in self._counts.most_common()
+            ]
+        with open(self.path, "w", encoding="utf-8") as f:
+            json.dump(data, f, indent=4)
+
+
+class RecordingReporter:
+    """
+    Wraps a Reporter and logs every report call in a CallLog before
+    passing it on through Reporter.cached(), so calls are answered from the
+    result cache that Warmup fills. Calls that write a CSV file skip the
+    cache. Everything else behaves like the wrapped Reporter.
+    """
+
+    def __init__(self, reporter: Reporter, log: CallLog) -> None:
+        """
+        Initializes a RecordingReporter.
+
+        Args:
+            reporter (Reporter): The Reporter that answers the calls.
+            log (CallLog): Where the calls are counted.
+        """
+        self._reporter = reporter
+        self._log = log
+
+    def __getattr__(self, name):
+        attribute = getattr(self._reporter, name)
+        if not _is_report(name):
+            return attribute
+
+        def recorded(*args, **kwargs):
+            self._log.record(name, args, kwargs)
+            arguments = _bind(name, args, kwargs)
+            if arguments.pop("to_csv", False):
+                return attribute(*args, **kwargs)  # Writes a file, never cached
+            return self._reporter.cached(name, **arguments)
+
+        return recorded
+
+
+class Warmup:
+    """
+    Replays the most frequent Reporter calls on a background thread at
+    startup. That loads the SQLite pages and, when the Reporter has its
+    result cache enabled, fills that cache.
+
+    A health check can use is_ready() to route traffic only to workers
+    whose warm-up has finished.
+
+    Attributes:
+        replayed (int): Number of calls replayed so far.
+        errors (list[tuple[str, Exception]]): Calls that failed, with the error.
+        duration (float): Seconds the warm-up took, once it is finished.
+    """
+
+    def __init__(self, reporter: Reporter, log: CallLog, max_calls: int = 100):
+        """
+        Initializes a Warmup.
+
+        Args:
+            reporter (Reporter): The serving Reporter, opened with
+                check_same_thread=False.
+            log (CallLog): The recorded calls to replay.
+            max_calls (int): Most calls to replay, the most frequent first.
+        """
+        self.reporter = reporter
+        self.log = log
+        self.max_calls = max_calls
+        self.replayed = 0
+        self.errors = []
+        self.duration = None
+        self._ready = threading.Event()
+        self._thread = None
+
+    def start(self) -> None:
+        """Starts the warm-up on a background thread."""
+        self._thread = threading.Thread(target=self._run, name="Warmup", daemon=True)
+        self._thread.start()
+
+    def is_ready(self) -> bool:
+        """Returns True once every call has been replayed."""
+        return self._ready.is_set()
+
+    def wait(self, timeout: float = None) -> bool:
+        """
+        Waits for the warm-up to finish.
+
+        Args:
+            timeout (float, optional): Most seconds to wait.
+
+        Returns:
+            bool: True if the warm-up finished.
+        """
+        return self._ready.wait(timeout)
+
+    def _run(self) -> None:
+        """Replays the calls; a failing call is noted and skipped."""
+        started = time.perf_counter()
+        try:
+            for report, kwargs in self.log.most_common(self.max_calls):
+                try:
+                    result = self.reporter.cached(report, **kwargs)
+                    if isinstance(result, memorybudget.SpilledResult):
+                        result.close()  # Never cached, so nobody else has it
+                except Exception as e:  # A bad logged call must not stop warm-up
+                    self.errors.append((report, e))
+                self.replayed += 1
+        finally:
+            self.duration = time.perf_counter() - started
+            self._ready.set()